@@ -0,0 +1,56 @@
+""" Keep generated, clustered grids on disk so repeated runs can skip generating them
+Grids are stored as plain boolean .npy files, which numpy can memory-map without reading or copying them
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+# Bump this whenever generation or clustering changes, so that stale grids are not reused
+CACHE_VERSION = 1
+
+
+class DiskGridCache:
+    def __init__(self, directory: str | os.PathLike):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, size: int, location_probability: float, seed: float) -> Path:
+        # The seed can be anything random.seed accepts, so hash it to get a safe file name
+        seed_hash = hashlib.sha1(repr(seed).encode()).hexdigest()[:16]
+        return self.directory / f"grid-v{CACHE_VERSION}-{size}-{location_probability!r}-{seed_hash}.npy"
+
+    def load(self, size: int, location_probability: float, seed: float) -> np.ndarray | None:
+        """Memory-map a cached grid, or return None if it is not cached
+
+        The map is copy-on-write, so a model can change its grid without touching the file.
+        """
+        path = self.path(size, location_probability, seed)
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode="c")
+
+    def save(self, size: int, location_probability: float, seed: float, grid: np.ndarray):
+        """Write a grid, via a temporary file so that concurrent runs never see a partial one"""
+
+        path = self.path(size, location_probability, seed)
+        temporary_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            np.save(file, np.ascontiguousarray(grid, dtype=bool))
+        os.replace(temporary_path, path)
+
+    def get_or_create(
+        self, size: int, location_probability: float, seed: float, create: Callable[[], np.ndarray]
+    ) -> np.ndarray:
+        """Load a grid, or create, save and reload it. Grids without a seed are random, so they are never cached"""
+
+        if seed is None:
+            return create()
+        grid = self.load(size, location_probability, seed)
+        if grid is None:
+            self.save(size, location_probability, seed, create())
+            grid = self.load(size, location_probability, seed)
+        return grid
@@ -1,19 +1,41 @@
 """ Main module for surveying solution.
 Calls each separate solution and summarizes results and performance """
 
+import gc
+import multiprocessing
+import os
+import random
+import statistics
 import time
-import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import pyjion
 from itertools import product
 from typing import Type, TYPE_CHECKING
 
+from cache import DiskGridCache
 from orchestrator import GridOrchestrator
+from src.model import PHASES, GENERATE, CLUSTER, Reservoirs, traced_peak_memory
 
 if TYPE_CHECKING:
     from view import GridView
 
-sys.setrecursionlimit(1000000)
+# Longest edge, in pixels, of the images written of each grid
+MAX_IMAGE_SIZE = 4096
+
+
+def _init_worker(cpus: "multiprocessing.Queue", disk_cache: DiskGridCache | None, max_cache_bytes: int | None):
+    """Give each worker process a CPU of its own, so that timings in one worker are not disturbed by another
+
+    Workers that are spawned rather than forked start with a fresh GridOrchestrator, so its settings are passed in.
+    """
+
+    cpu = cpus.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    GridOrchestrator.disk_cache = disk_cache
+    GridOrchestrator.max_cache_bytes = max_cache_bytes
 
 
 class DesignOfExperiments:
@@ -23,36 +45,110 @@ class DesignOfExperiments:
         location_probabilities: list[float],
         model_types: list,
         pyjion_state: list[bool],
+        workers: int = None,
+        warmup: int = 0,
+        repeats: int = 1,
+        profile_memory: bool = False,
+        seed: float = None,
+        image_directory: str = None,
     ):
+        """workers: Run the points of the experiment in this many processes at once. If None, run them serially
+        warmup: Number of untimed runs of each method before timing starts
+        repeats: Number of timed runs of each method, which are summarized in the results
+        profile_memory: Record the peak memory allocated while building each grid and while finding its reservoirs.
+            Grids are built under tracemalloc, which slows down their Generate and Cluster timings
+        seed: Random seed for every grid. Grids are only cached on disk when this is set
+        image_directory: Write each grid's reservoirs to a PNG image in this directory, instead of printing the grid
+        """
 
         self.grid_sizes = grid_sizes
         self.location_probabilities = location_probabilities
         self.model_types = model_types
         self.pyjion_state = pyjion_state
+        self.workers = workers
+        self.warmup = warmup
+        self.repeats = repeats
+        self.profile_memory = profile_memory
+        self.seed = seed
+        self.image_directory = image_directory
 
     def run(self) -> pd.DataFrame:
-        results = []
-
-        for grid_size, location_probability, model_type, pyjion_state in product(
-            self.grid_sizes,
-            self.location_probabilities,
-            self.model_types,
-            self.pyjion_state,
-        ):
-            print("*" * 30)
-            print(
-                f"Grid size: {grid_size}, Probability: {location_probability}, "
-                f"Model Type: {model_type}, Pyjion: {pyjion_state}"
+        points = list(
+            product(
+                self.grid_sizes,
+                self.location_probabilities,
+                self.model_types,
+                self.pyjion_state,
             )
-            self._set_pyjion(pyjion_state)
+        )
+        if self.workers:
+            results = self._run_parallel(points)
+        else:
+            results = [self._run_point(*point, seed=self.seed) for point in points]
+        return pd.DataFrame(results)
+
+    def _run_parallel(self, points: list[tuple]) -> list[dict[str, int | float | str]]:
+        """Farm the points out to a process pool with one CPU per worker. The largest grids are submitted first so
+        that they do not hold up the end of the run, but the rows are returned in the same order as a serial run"""
+
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        workers = min(self.workers, len(cpus))
+
+        cpu_queue = multiprocessing.Queue()
+        for cpu in cpus[:workers]:
+            cpu_queue.put(cpu)
+
+        # Each worker has its own registry of grids, so without a seed every method would get a different random grid.
+        # Instead, give each grid size and probability its own random seed, shared by every method at that point
+        if self.seed is None:
+            generator = random.Random()
+            seeds = {point[:2]: generator.getrandbits(64) for point in points}
+            # These grids will never be asked for again, so keep them off the disk
+            disk_cache = None
+        else:
+            seeds = {point[:2]: self.seed for point in points}
+            disk_cache = GridOrchestrator.disk_cache
+
+        schedule = sorted(range(len(points)), key=lambda idx: points[idx][0], reverse=True)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(cpu_queue, disk_cache, GridOrchestrator.max_cache_bytes),
+        ) as executor:
+            futures = {
+                idx: executor.submit(self._run_point, *points[idx], seed=seeds[points[idx][:2]]) for idx in schedule
+            }
+            return [futures[idx].result() for idx in range(len(points))]
+
+    def _run_point(
+        self, grid_size: int, location_probability: float, model_type: Type, pyjion_state: bool, seed: float = None
+    ) -> dict[str, int | float | str]:
+        print("*" * 30)
+        print(
+            f"Grid size: {grid_size}, Probability: {location_probability}, "
+            f"Model Type: {model_type}, Pyjion: {pyjion_state}"
+        )
+        if model_type.max_size is not None and grid_size > model_type.max_size:
+            # Keep a row for the point, so the results show where the method stops being usable
+            print(f"Skipped: {model_type.__name__} only runs on grids up to {model_type.max_size}")
+            return {"Grid Size": grid_size, "Probability": location_probability, "Method": model_type}
+        self._set_pyjion(pyjion_state)
+        if self.profile_memory:
+            tracemalloc.start()
+        try:
             grid = GridOrchestrator.get_grid_view_with_parameters(
                 grid_size=grid_size,
                 location_probability=location_probability,
                 model_type=model_type,
+                seed=seed,
             )
-            row_dict = self._run_method(grid, model_type)
-            results.append(row_dict)
-        return pd.DataFrame(results)
+        finally:
+            if self.profile_memory:
+                tracemalloc.stop()
+        return self._run_method(grid, model_type, pyjion_state)
 
     @staticmethod
     def _set_pyjion(pyjion_state: bool):
@@ -62,13 +158,21 @@ class DesignOfExperiments:
         else:
             pyjion.disable()
 
-    @staticmethod
-    def _run_method(grid: "GridView", model_type: Type) -> dict[str, int | float | str]:
+    def _run_method(
+        self, grid: "GridView", model_type: Type, pyjion_state: bool = False
+    ) -> dict[str, int | float | str]:
         print(f"-" * 20)
         print(f"Method: {grid}")
-        sim_run = SimulationRun(grid)
+        sim_run = SimulationRun(
+            grid, warmup=self.warmup, repeats=self.repeats, profile_memory=self.profile_memory
+        )
         sim_run.execute()
-        sim_run.print_grid()
+        if self.image_directory is None:
+            sim_run.print_grid()
+        else:
+            pyjion_name = "pyjion" if pyjion_state else "no_pyjion"
+            name = f"{model_type.__name__}_{grid.size}_{grid.location_probability}_{pyjion_name}.png"
+            sim_run.write_image(os.path.join(self.image_directory, name))
         sim_run.print_results()
         row_dict = {
             "Grid Size": grid.size,
@@ -77,15 +181,48 @@ class DesignOfExperiments:
             "Method": model_type,
             "Number of Wells": sim_run.number_of_wells,
             "Time": sim_run.time_to_run,
+            "Repeats": len(sim_run.times),
+            "Time Min": sim_run.min_time,
+            "Time Median": sim_run.median_time,
+            "Time Stdev": sim_run.stdev_time,
+            "Time IQR": sim_run.iqr_time,
         }
+        phase_times = sim_run.median_phase_times
+        for phase in PHASES:
+            row_dict[f"{phase} Time"] = phase_times.get(phase)
+        if self.profile_memory:
+            construction_memory = [
+                grid.phase_peak_memory[phase] for phase in (GENERATE, CLUSTER) if phase in grid.phase_peak_memory
+            ]
+            row_dict["Grid Peak Memory"] = max(construction_memory, default=None)
+            row_dict["Reservoirs Peak Memory"] = sim_run.peak_memory
         return row_dict
 
 
 class SimulationRun:
-    def __init__(self, grid: "GridView"):
+    def __init__(
+        self,
+        grid: "GridView",
+        warmup: int = 0,
+        repeats: int = 1,
+        disable_gc: bool = True,
+        profile_memory: bool = False,
+    ):
+        """grid: The grid to find reservoirs in
+        warmup: Number of untimed runs, to absorb one-off costs such as imports
+        repeats: Number of timed runs
+        disable_gc: Collect garbage before each timed run and keep the collector off while it runs
+        profile_memory: After the timed runs, do one more run under tracemalloc to find its peak memory
+        """
         self.grid = grid
+        self.warmup = warmup
+        self.repeats = max(repeats, 1)
+        self.disable_gc = disable_gc
+        self.profile_memory = profile_memory
+        self.peak_memory: int | None = None
         self.wells = None
-        self._time_taken = None
+        self.times: list[float] = []
+        self.phase_times: list[dict[str, float]] = []
 
     @property
     def number_of_wells(self) -> int | None:
@@ -94,8 +231,49 @@ class SimulationRun:
         return len(self.wells)
 
     @property
-    def time_to_run(self) -> float:
-        return self._time_taken
+    def time_to_run(self) -> float | None:
+        """The median of the timed runs"""
+        return self.median_time
+
+    @property
+    def min_time(self) -> float | None:
+        if not self.times:
+            return None
+        return min(self.times)
+
+    @property
+    def median_time(self) -> float | None:
+        if not self.times:
+            return None
+        return statistics.median(self.times)
+
+    @property
+    def stdev_time(self) -> float | None:
+        if not self.times:
+            return None
+        if len(self.times) < 2:
+            return 0.0
+        return statistics.stdev(self.times)
+
+    @property
+    def iqr_time(self) -> float | None:
+        if not self.times:
+            return None
+        if len(self.times) < 2:
+            return 0.0
+        lower_quartile, _, upper_quartile = statistics.quantiles(self.times, n=4)
+        return upper_quartile - lower_quartile
+
+    @property
+    def median_phase_times(self) -> dict[str, float]:
+        """The median time of each phase that the grid reported, over the timed runs, in the order of PHASES"""
+        return {
+            phase: statistics.median(
+                run_phase_times[phase] for run_phase_times in self.phase_times if phase in run_phase_times
+            )
+            for phase in PHASES
+            if any(phase in run_phase_times for run_phase_times in self.phase_times)
+        }
 
     @property
     def average_well_size(self) -> float | None:
@@ -103,20 +281,66 @@ class SimulationRun:
             return None
         if self.number_of_wells == 0:
             return 0
+        if isinstance(self.wells, Reservoirs):
+            # Avoid building a set for every reservoir just to measure it
+            return int(self.wells.sizes.sum()) / self.number_of_wells
         return sum([len(well) for well in self.wells]) / self.number_of_wells
 
     def execute(self):
         """Main module for surveying solution.
         grid_size: One-dimensional size of the grid to be used for evaluation"""
 
-        start = time.perf_counter()
-        self.wells = self.grid.get_reservoirs()
-        stop = time.perf_counter()
-        self._time_taken = stop - start
+        for _ in range(self.warmup):
+            self.grid.get_reservoirs()
+
+        gc_was_enabled = gc.isenabled()
+        self.times = []
+        self.phase_times = []
+        try:
+            for _ in range(self.repeats):
+                if self.disable_gc:
+                    gc.collect()
+                    gc.disable()
+                start = time.perf_counter()
+                self.wells = self.grid.get_reservoirs()
+                stop = time.perf_counter()
+                if gc_was_enabled:
+                    gc.enable()
+                self.times.append(stop - start)
+                self.phase_times.append(dict(self.grid.phase_times))
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        if self.profile_memory:
+            self._measure_peak_memory()
+
+    def _measure_peak_memory(self):
+        """Run once more under tracemalloc, which is too slow to leave on for the timed runs"""
+
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            # The phases inside measure their own peaks, which traced_peak_memory folds into this one
+            with traced_peak_memory() as peak_memory:
+                self.grid.get_reservoirs()
+            self.peak_memory = peak_memory[0]
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
 
     def print_grid(self):
-        result = self.grid.to_ascii_art()
-        print(result)
+        self.grid.to_ascii_art()
+
+    def write_image(self, path: str):
+        """Save the reservoirs as a PNG, downsampled so that its edges are no more than MAX_IMAGE_SIZE pixels"""
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        step = max(1, -(-self.grid.size // MAX_IMAGE_SIZE))
+        # Reuse the labelling from the timed runs rather than solving the grid again
+        labels = self.wells.labels() if isinstance(self.wells, Reservoirs) else None
+        self.grid.write_image(path, reservoirs=True, step=step, labels=labels)
 
     def print_results(self):
         if self.wells is None:
@@ -128,6 +352,15 @@ class SimulationRun:
         print(f"Average well size: {self.average_well_size}")
         print(f"Number of wells needed: {self.number_of_wells}")
         print(f"Time to run: {self.time_to_run}")
+        for phase, phase_time in self.median_phase_times.items():
+            print(f"{phase}: {phase_time:.3E} s")
+        if self.peak_memory is not None:
+            print(f"Peak memory: {self.peak_memory} bytes")
+        if len(self.times) > 1:
+            print(
+                f"Over {len(self.times)} runs: min {self.min_time:.3E} s, "
+                f"stdev {self.stdev_time:.3E} s, IQR {self.iqr_time:.3E} s"
+            )
 
     def _print_reservoir_details(self):
         if self.number_of_wells < 10:
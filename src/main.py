@@ -5,9 +5,18 @@ from src.model import (
     DequeMethod,
     StackMethod,
     IGraphMethod,
+    GraphToolMethod,
     RecursiveMethod,
+    IterativeDFSMethod,
+    UnionFindMethod,
+    HoshenKopelmanMethod,
+    ScipyMethod,
 )
+from src.parallel import TileParallelMethod
+from src.transform import XsltMethod, FastXsltMethod
 from doe import DesignOfExperiments
+from cache import DiskGridCache
+from orchestrator import GridOrchestrator
 
 
 parser = argparse.ArgumentParser(
@@ -16,58 +25,115 @@ parser = argparse.ArgumentParser(
 parser.add_argument(
     "--grid_size", type=int, help="Size of the grid to be generated", default=50
 )
-args = parser.parse_args()
-
-doe = DesignOfExperiments(
-    grid_sizes=[
-        10,
-        50,
-        # 100,
-        # 500,
-        # 1000,
-        # 5000,
-        # 10000,
-    ],
-    location_probabilities=[
-        0.99,
-        0.95,
-        0.9,
-        # 0.85,
-        # 0.8,
-        # 0.75,
-        # 0.7,
-    ],
-    model_types=[
-        NetworkXMethod,
-        DequeMethod,
-        RecursiveMethod,
-        StackMethod,
-        IGraphMethod,
-    ],
-    pyjion_state=[True, False],
+parser.add_argument(
+    "--workers",
+    type=int,
+    help="Number of processes to run the experiment in, each pinned to its own CPU",
+    default=None,
+)
+parser.add_argument(
+    "--warmup", type=int, help="Number of untimed runs of each method", default=0
+)
+parser.add_argument(
+    "--repeats", type=int, help="Number of timed runs of each method", default=1
+)
+parser.add_argument(
+    "--profile_memory",
+    action="store_true",
+    help="Record peak memory use for building each grid and finding its reservoirs",
+)
+parser.add_argument(
+    "--seed", type=int, help="Random seed used for every grid", default=None
+)
+parser.add_argument(
+    "--grid_cache_dir",
+    help="Directory to store generated grids in and reload them from. Requires --seed",
+    default=None,
+)
+parser.add_argument(
+    "--grid_cache_mb",
+    type=float,
+    help="Most memory, in MB, to spend keeping grids for reuse by other methods. Unlimited by default",
+    default=None,
 )
+parser.add_argument(
+    "--image_dir",
+    help="Directory to save a PNG of each grid's reservoirs in, instead of printing the grids",
+    default=None,
+)
+# Worker processes import this module when they are spawned rather than forked, so only run the experiment once
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.grid_cache_dir is not None:
+        GridOrchestrator.disk_cache = DiskGridCache(args.grid_cache_dir)
+    if args.grid_cache_mb is not None:
+        GridOrchestrator.max_cache_bytes = int(args.grid_cache_mb * 1024 * 1024)
+
+    doe = DesignOfExperiments(
+        grid_sizes=[
+            10,
+            50,
+            # 100,
+            # 500,
+            # 1000,
+            # 5000,
+            # 10000,
+        ],
+        location_probabilities=[
+            0.99,
+            0.95,
+            0.9,
+            # 0.85,
+            # 0.8,
+            # 0.75,
+            # 0.7,
+        ],
+        model_types=[
+            NetworkXMethod,
+            DequeMethod,
+            RecursiveMethod,
+            IterativeDFSMethod,
+            StackMethod,
+            IGraphMethod,
+            GraphToolMethod,
+            UnionFindMethod,
+            HoshenKopelmanMethod,
+            ScipyMethod,
+            TileParallelMethod,
+            XsltMethod,
+            FastXsltMethod,
+        ],
+        pyjion_state=[True, False],
+        workers=args.workers,
+        warmup=args.warmup,
+        repeats=args.repeats,
+        profile_memory=args.profile_memory,
+        seed=args.seed,
+        image_directory=args.image_dir,
+    )
 
-df = doe.run()
+    df = doe.run()
 
-# time_taken_sorted = sorted(time_taken.items(), key=lambda item: item[1])
-# for idx, (method_name, duration) in enumerate(time_taken_sorted):
-#     if idx == 0:
-#         shortest_time = duration
-#         shortest_method = method_name
-#         print(
-#             f"{1}: "
-#             f"{shortest_method.ljust(20)}"
-#             f"Time taken: {shortest_time:.3E} s"
-#         )
-#     else:
-#         print(
-#             f"{idx + 1}: "
-#             f"{method_name.ljust(20)}"
-#             f"Time taken: {duration:.3E} s, "
-#             f"{duration / shortest_time:.2f} times slower than {shortest_method}"
-#         )
-# df = df.astype(
-#     {"Grid Size": "int32", "Number of Sites": "int32", "Number of Wells": "int32"}
-# )
-# df.set_index(["Grid Size", "Probability"], inplace=True)
-# df.to_pickle('results/results_all_methods_sparse.pkl')
+    # time_taken_sorted = sorted(time_taken.items(), key=lambda item: item[1])
+    # for idx, (method_name, duration) in enumerate(time_taken_sorted):
+    #     if idx == 0:
+    #         shortest_time = duration
+    #         shortest_method = method_name
+    #         print(
+    #             f"{1}: "
+    #             f"{shortest_method.ljust(20)}"
+    #             f"Time taken: {shortest_time:.3E} s"
+    #         )
+    #     else:
+    #         print(
+    #             f"{idx + 1}: "
+    #             f"{method_name.ljust(20)}"
+    #             f"Time taken: {duration:.3E} s, "
+    #             f"{duration / shortest_time:.2f} times slower than {shortest_method}"
+    #         )
+    # df = df.astype(
+    #     {"Grid Size": "int32", "Number of Sites": "int32", "Number of Wells": "int32"}
+    # )
+    # df.set_index(["Grid Size", "Probability"], inplace=True)
+    # df.to_pickle('results/results_all_methods_sparse.pkl')
@@ -5,52 +5,338 @@ get_neighbors: Find the number of active neighbor elements for a given element
 
 import random
 import itertools
+import sys
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator
+from collections.abc import Collection, Sequence
 import time
+import tracemalloc
+
+import numpy as np
 
 THRESHOLD = 0.85
 
+# Number of cells drawn from the random generator per block when building a grid, which bounds the size of the
+# temporary float array needed for very large grids
+GENERATION_BLOCK_SIZE = 1 << 22
+
+# Number of 64-bit values the Philox generator produces per counter step
+PHILOX_BLOCK = 4
+
 Cell = tuple[int, int]
 
+# Coordinate offsets of the 8 neighbors of an element, in the order get_neighbors reports them
+NEIGHBOR_OFFSETS = tuple(
+    (x_offset, y_offset) for x_offset in (-1, 0, 1) for y_offset in (-1, 0, 1) if x_offset or y_offset
+)
+
+# Phases that models report timings for, in the order they happen
+GENERATE, CLUSTER, BUILD, SOLVE, CONVERT = PHASES = ("Generate", "Cluster", "Build", "Solve", "Convert")
+
+
+# Highest traced memory seen so far by each open traced_peak_memory measurement, innermost last
+_open_peak_measurements: list[list[int]] = []
+
+
+@contextmanager
+def traced_peak_memory() -> Iterator[list[int]]:
+    """Measure the peak memory traced by tracemalloc during the body, above the memory traced at the start
+
+    Yields a one-element list that holds the peak when the body finishes. tracemalloc has a single peak, which each
+    measurement resets, so measurements nest by handing the peak seen so far to the measurement around them first.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    if _open_peak_measurements:
+        _open_peak_measurements[-1][0] = max(_open_peak_measurements[-1][0], peak)
+    tracemalloc.reset_peak()
+    highest = [current]
+    _open_peak_measurements.append(highest)
+    result = [0]
+    try:
+        yield result
+    finally:
+        _open_peak_measurements.pop()
+        highest[0] = max(highest[0], tracemalloc.get_traced_memory()[1])
+        if _open_peak_measurements:
+            _open_peak_measurements[-1][0] = max(_open_peak_measurements[-1][0], highest[0])
+        result[0] = highest[0] - current
+
+
+def generate_strips(
+    size: int, location_probability: float, seed: float = None
+) -> Iterator[np.ndarray]:
+    """Draw the unclustered random grid as a sequence of boolean strips of whole rows"""
+
+    key = _philox_key(seed)
+    rows_per_strip = max(1, GENERATION_BLOCK_SIZE // max(size, 1))
+    for start in range(0, size, rows_per_strip):
+        stop = min(start + rows_per_strip, size)
+        yield _draw_rows(key, size, location_probability, start, stop)
+
+
+def generate_tile(
+    size: int, location_probability: float, seed: float, start: int, stop: int
+) -> np.ndarray:
+    """Draw rows start to stop of the unclustered random grid
+
+    Tiles are identical to the same rows of the whole grid, whatever order or process they are drawn in. The seed
+    must not be None, as every tile would then come from a different grid.
+    """
+    return _draw_rows(_philox_key(seed), size, location_probability, start, stop)
+
+
+def generate_clustered_tile(
+    size: int, location_probability: float, seed: float, start: int, stop: int
+) -> np.ndarray:
+    """Rows start to stop of the clustered grid, drawing one extra row either side so the edges cluster correctly"""
+
+    halo_start, halo_stop = max(start - 1, 0), min(stop + 1, size)
+    clustered = cluster(generate_tile(size, location_probability, seed, halo_start, halo_stop))
+    return clustered[start - halo_start : stop - halo_start]
+
+
+def _philox_key(seed: float) -> int:
+    """Reduce anything accepted by random.seed to a 128-bit key, without touching the global random state"""
+    return random.Random(seed).getrandbits(128)
+
+
+def _draw_rows(
+    key: int, size: int, location_probability: float, start: int, stop: int
+) -> np.ndarray:
+    """Philox is counter-based, so the generator can skip straight to the first element of the rows. It produces
+    values in blocks of PHILOX_BLOCK and can only skip whole blocks, so any remainder is drawn and discarded"""
+
+    stop = min(stop, size)
+    first_element = start * size
+    bit_generator = np.random.Philox(key=key)
+    bit_generator.advance(first_element // PHILOX_BLOCK)
+    rng = np.random.Generator(bit_generator)
+    rng.random(first_element % PHILOX_BLOCK)
+    return rng.random((stop - start, size)) > location_probability
+
+
+def count_neighbors(
+    grid: np.ndarray, above: np.ndarray = None, below: np.ndarray = None
+) -> np.ndarray:
+    """Count the active neighbors of every element at once by summing shifted copies of a zero-padded grid
+
+    above, below: Optional rows bordering the grid, used when the grid is one strip of a larger grid
+    """
+    rows, columns = grid.shape
+    padded = np.zeros((rows + 2, columns + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = grid
+    if above is not None:
+        padded[0, 1:-1] = above
+    if below is not None:
+        padded[-1, 1:-1] = below
+
+    neighbor_count = np.zeros((rows, columns), dtype=np.uint8)
+    for x_offset in range(3):
+        for y_offset in range(3):
+            if x_offset == 1 and y_offset == 1:
+                continue
+            neighbor_count += padded[x_offset : x_offset + rows, y_offset : y_offset + columns]
+    return neighbor_count
+
+
+def cluster(grid: np.ndarray, above: np.ndarray = None, below: np.ndarray = None) -> np.ndarray:
+    """Keep an element if it is active and not isolated, or if it has at least 4 active neighbors"""
+
+    neighbor_count = count_neighbors(grid, above, below)
+    return (grid & (neighbor_count != 0)) | (neighbor_count >= 4)
+
+
+def cluster_strips(strips: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+    """Cluster a grid that arrives as strips of rows, holding back each strip until the first row of the next one
+    is known"""
+
+    above = None
+    pending = None
+    for strip in strips:
+        if len(strip) == 0:
+            continue
+        if pending is not None:
+            yield cluster(pending, above, strip[0])
+            above = pending[-1]
+        pending = strip
+    if pending is not None:
+        yield cluster(pending, above)
+
+
+def find_runs(row: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start (inclusive) and end (exclusive) indices of each run of active elements in a row"""
+
+    edges = np.diff(row.astype(np.int8), prepend=0, append=0)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def push_active_neighbors(padded: bytearray, flat_offsets: tuple[int, ...], index: int, stack: list[int]):
+    """Fast path for hot loops: append the padded indices of the active neighbors of the element at a padded index
+    to a list the caller reuses, such as a flood fill's stack, so nothing is allocated per element
+
+    padded, flat_offsets: From GridModel._flat_neighbor_table, fetched once per solve rather than once per element
+    """
+    for flat_offset in flat_offsets:
+        if padded[index + flat_offset]:
+            stack.append(index + flat_offset)
+
+
+class Adjacency:
+    # Offsets of the neighbors that come before an element in a row-major scan. Joining each element to these gives
+    # every pair of neighbors exactly once
+    BACKWARD_OFFSETS = ((0, -1), (-1, -1), (-1, 0), (-1, 1))
+
+    def __init__(self, grid: np.ndarray):
+        """The 8-neighbor graph of the active elements of a grid, built with vectorized operations
+
+        Vertices are numbered 0..n-1 in order of their flat index x * size + y, so vertex_index maps each vertex back
+        to the grid. Each undirected edge is held once, in sources and targets.
+        """
+        rows, columns = grid.shape
+        self.columns = columns
+        self.vertex_index = np.flatnonzero(grid)
+
+        ids = np.full(grid.shape, -1, dtype=np.int64)
+        ids.flat[self.vertex_index] = np.arange(len(self.vertex_index))
+        padded = np.pad(ids, 1, constant_values=-1)
+        sources, targets = [], []
+        for x_offset, y_offset in self.BACKWARD_OFFSETS:
+            shifted = padded[1 + x_offset : 1 + x_offset + rows, 1 + y_offset : 1 + y_offset + columns]
+            mask = (ids >= 0) & (shifted >= 0)
+            sources.append(ids[mask])
+            targets.append(shifted[mask])
+        self.sources = np.concatenate(sources)
+        self.targets = np.concatenate(targets)
+
+    @property
+    def number_of_vertices(self) -> int:
+        return len(self.vertex_index)
+
+    @property
+    def edges(self) -> np.ndarray:
+        """An (m, 2) array with one row per undirected edge"""
+        return np.column_stack((self.sources, self.targets))
+
+    def csr(self) -> tuple[np.ndarray, np.ndarray]:
+        """The symmetric adjacency in compressed sparse row form, as (indptr, indices)"""
+
+        sources = np.concatenate((self.sources, self.targets))
+        targets = np.concatenate((self.targets, self.sources))
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(self.number_of_vertices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=self.number_of_vertices), out=indptr[1:])
+        return indptr, targets[order]
+
+    def coordinates(self) -> tuple[np.ndarray, np.ndarray]:
+        """The x and y coordinates of every vertex"""
+        return np.divmod(self.vertex_index, self.columns)
+
 
 class GridModel(ABC):
+    # The grid that the cached neighbor table was built from
+    _padded_source = None
+    # Largest grid size that DesignOfExperiments runs the method on, or None for no limit
+    max_size: int | None = None
+
     def __init__(
-        self, size: int, location_probability: float = THRESHOLD, seed: float = None
+        self,
+        size: int,
+        location_probability: float = THRESHOLD,
+        seed: float = None,
+        grid: np.ndarray = None,
     ):
         """Build a square grid of elements, where each element may or may not contain oil
 
         size: The number of elements along one edge of the grid
         seed: Random seed to be used to generate the grid
+        grid: An already clustered grid, e.g. from a cache, to use instead of generating one
         """
         self.size = size
         self.location_probability = location_probability
         self.seed = seed
-        random.seed(seed)
+        self.phase_times: dict[str, float] = {}
+        self.phase_peak_memory: dict[str, int] = {}
+        if grid is not None:
+            if grid.shape != (size, size):
+                raise ValueError(f"Grid of shape {grid.shape} does not match size {size}")
+            self._grid = grid
+            return
         if location_probability is None:
             location_probability = THRESHOLD
-        self._grid = set()
-        for location in itertools.product(range(0, size), repeat=2):
-            if random.random() > location_probability:
-                self._grid.add(location)
-        self._grid = self._cluster()
+        with self._timed_phase(GENERATE):
+            self._grid = self._generate(location_probability)
+        with self._timed_phase(CLUSTER):
+            self._grid = self._cluster()
 
-    def _cluster(self) -> set[Cell]:
+    @contextmanager
+    def _timed_phase(self, phase: str) -> Iterator[None]:
+        """Record how long the body takes in phase_times, replacing any earlier timing of the same phase
+
+        If tracemalloc is tracing, the peak memory allocated during the phase is also recorded in phase_peak_memory
+        """
+
+        if not tracemalloc.is_tracing():
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.phase_times[phase] = time.perf_counter() - start
+            return
+
+        with traced_peak_memory() as peak_memory:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.phase_times[phase] = time.perf_counter() - start
+        self.phase_peak_memory[phase] = peak_memory[0]
+
+    def _generate(self, location_probability: float) -> np.ndarray:
+        """Draw the random grid as a dense boolean array indexed by [x, y]"""
+
+        grid = np.empty((self.size, self.size), dtype=bool)
+        start = 0
+        for strip in generate_strips(self.size, location_probability, self.seed):
+            grid[start : start + len(strip)] = strip
+            start += len(strip)
+        return grid
+
+    def _cluster(self) -> np.ndarray:
         """Cluster the grid. If an active element is not isolated or if an inactive element has at least 4 active
         neighbors. Kind of Game of Life-esque"""
 
-        clustered_grid = set()
+        return cluster(self._grid)
+
+    def _cluster_iterative(self) -> np.ndarray:
+        """Reference implementation of _cluster that visits every element in turn"""
+
+        clustered_grid = np.zeros_like(self._grid)
+        padded, flat_offsets = self._flat_neighbor_table()
+        neighbors = []
         for location in itertools.product(range(0, self.size), repeat=2):
-            state = location in self._grid
-            sites_nearby = self.get_neighbors(location)
-            neighbor_count = len(sites_nearby)
+            state = self._grid[location]
+            neighbors.clear()
+            push_active_neighbors(padded, flat_offsets, self._padded_index(location), neighbors)
+            neighbor_count = len(neighbors)
             if (state and neighbor_count != 0) or neighbor_count >= 4:
-                clustered_grid.add(location)
+                clustered_grid[location] = True
         return clustered_grid
 
     @property
-    def cells(self) -> set[Cell]:
+    def grid(self) -> np.ndarray:
+        """The grid as a boolean array indexed by [x, y]. This is the underlying storage, not a copy"""
         return self._grid
 
+    @property
+    def cells(self) -> set[Cell]:
+        """A new set containing the coordinates of every active element"""
+        return set(zip(*map(np.ndarray.tolist, np.nonzero(self._grid))))
+
+    @property
+    def number_of_cells(self) -> int:
+        return int(np.count_nonzero(self._grid))
+
     def get_neighbors(self, grid_element) -> list[Cell]:
         """Returns a list of neighbor location objects
 
@@ -58,26 +344,181 @@ class GridModel(ABC):
         grid: A dictionary containing all elements and their state
         """
         x_coord, y_coord = grid_element
-        x_offsets = [-1, 0, 1]
-        y_offsets = [-1, 0, 1]
+        rows, columns = self._grid.shape
+        if 0 <= x_coord < rows and 0 <= y_coord < columns:
+            padded, neighbor_table = self._neighbor_table()
+            index = (x_coord + 1) * (columns + 2) + y_coord + 1
+            return [
+                (x_coord + x_offset, y_coord + y_offset)
+                for x_offset, y_offset, flat_offset in neighbor_table
+                if padded[index + flat_offset]
+            ]
 
         neighbors = list()
-        for x_offset in x_offsets:
-            for y_offset in y_offsets:
-                if x_offset == 0 and y_offset == 0:
-                    continue
-                coord = (x_coord + x_offset, y_coord + y_offset)
-                if coord in self.cells:
-                    neighbors.append(coord)
+        for x_offset, y_offset in NEIGHBOR_OFFSETS:
+            coord = (x_coord + x_offset, y_coord + y_offset)
+            if self._is_active(coord):
+                neighbors.append(coord)
         return neighbors
 
+    def _neighbor_table(self) -> tuple[bytearray, tuple[tuple[int, int, int], ...]]:
+        """The grid as a flat bytearray with a border of empty elements, and (x offset, y offset, flat offset) for
+        each of the 8 neighbors
+
+        Thanks to the border, the neighbors of any element of the grid can be read without bounds checks. The table
+        is rebuilt whenever _grid is replaced.
+        """
+        if self._padded_source is not self._grid:
+            width = self._grid.shape[1] + 2
+            self._padded = bytearray(np.pad(self._grid, 1).tobytes())
+            self._neighbor_offsets = tuple(
+                (x_offset, y_offset, x_offset * width + y_offset) for x_offset, y_offset in NEIGHBOR_OFFSETS
+            )
+            self._flat_offsets = tuple(flat_offset for _, _, flat_offset in self._neighbor_offsets)
+            self._padded_source = self._grid
+        return self._padded, self._neighbor_offsets
+
+    def _padded_index(self, grid_element: Cell) -> int:
+        x_coord, y_coord = grid_element
+        return (x_coord + 1) * (self._grid.shape[1] + 2) + y_coord + 1
+
+    def _flat_neighbor_table(self) -> tuple[bytearray, tuple[int, ...]]:
+        """The padded grid of _neighbor_table with just the flat offsets of the 8 neighbors, for push_active_neighbors
+
+        Changes made through add_cell and remove_cell show up in the same bytearray, but it is replaced along with
+        _grid, so fetch it again after replacing the grid.
+        """
+        self._neighbor_table()
+        return self._padded, self._flat_offsets
+
+    def _active_padded_indices(self) -> list[int]:
+        """Padded indices of the active elements, in the order of the grid"""
+
+        padded, _ = self._neighbor_table()
+        return np.flatnonzero(np.frombuffer(padded, dtype=np.uint8)).tolist()
+
+    def _is_active(self, grid_element: Cell) -> bool:
+        x_coord, y_coord = grid_element
+        if not (0 <= x_coord < self.size and 0 <= y_coord < self.size):
+            return False
+        return bool(self._grid[x_coord, y_coord])
+
+    def add_cell(self, grid_element: Cell):
+        """Mark an element as containing oil. Clustering is not reapplied"""
+        self._set_cell(grid_element, True)
+
+    def remove_cell(self, grid_element: Cell):
+        """Mark an element as not containing oil. Clustering is not reapplied"""
+        self._set_cell(grid_element, False)
+
+    def _set_cell(self, grid_element: Cell, state: bool):
+        x_coord, y_coord = grid_element
+        rows, columns = self._grid.shape
+        if not (0 <= x_coord < rows and 0 <= y_coord < columns):
+            raise IndexError(f"{grid_element} is outside the grid")
+        if not self._grid.flags.writeable:
+            # The grid is shared with other models, e.g. by GridOrchestrator, so take a private copy first
+            self._grid = np.array(self._grid)
+        self._grid[x_coord, y_coord] = state
+        if self._padded_source is self._grid:
+            self._padded[self._padded_index(grid_element)] = state
+
     @abstractmethod
     def find_reservoirs(self) -> list[set[Cell]]:
         pass
 
+    def adjacency(self) -> Adjacency:
+        return Adjacency(self._grid)
+
+    def _reservoirs_from_vertex_labels(self, adjacency: Adjacency, labels: np.ndarray) -> "Reservoirs":
+        """Convert a component label for every vertex of the adjacency into reservoirs"""
+
+        return Reservoirs(adjacency.vertex_index, np.asarray(labels), self._grid.shape)
+
+    def _reservoirs_from_padded_indices(self, reservoirs: list[Collection[int]]) -> "Reservoirs":
+        """Convert reservoirs held as padded indices of the neighbor table into reservoirs"""
+
+        width = self._grid.shape[1] + 2
+        padded_index = np.fromiter(
+            itertools.chain.from_iterable(reservoirs), dtype=np.int64, count=sum(map(len, reservoirs))
+        )
+        labels = np.repeat(np.arange(len(reservoirs)), [len(reservoir) for reservoir in reservoirs])
+        x_coords, y_coords = np.divmod(padded_index, width)
+        return Reservoirs((x_coords - 1) * self._grid.shape[1] + y_coords - 1, labels, self._grid.shape)
+
+    def _reservoirs_from_labels(self, labels: np.ndarray) -> "Reservoirs":
+        """Convert a label array, where 0 marks an empty element, into reservoirs"""
+
+        flat_index = np.flatnonzero(labels)
+        return Reservoirs(flat_index, labels.ravel()[flat_index], labels.shape)
+
+
+class Reservoirs(Sequence):
+    def __init__(self, flat_index: np.ndarray, labels: np.ndarray, shape: tuple[int, int]):
+        """A compact, read-only sequence of reservoirs, each of which is a set of elements
+
+        The elements are held as one array of flat indices x * size + y, sorted so that each reservoir is a
+        contiguous slice between two offsets. Counts and sizes come straight from the offsets, and a set is only
+        built when a reservoir is looked up or iterated over.
+
+        flat_index: Flat index of every element in a reservoir
+        labels: Reservoir label of every element, in any numbering
+        shape: Shape of the grid the elements belong to
+        """
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        boundaries = np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+        self._flat_index = flat_index[order]
+        self._offsets = np.concatenate(([0], boundaries, [len(order)])) if len(order) else np.zeros(1, dtype=np.int64)
+        self._shape = shape
+        self._membership = None
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[item] for item in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("reservoir index out of range")
+        x_coords, y_coords = np.divmod(
+            self._flat_index[self._offsets[index] : self._offsets[index + 1]], self._shape[1]
+        )
+        return set(zip(x_coords.tolist(), y_coords.tolist()))
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """Number of elements in each reservoir"""
+        return np.diff(self._offsets)
+
+    def size_histogram(self) -> dict[int, int]:
+        """Number of reservoirs of each size"""
+        sizes, counts = np.unique(self.sizes, return_counts=True)
+        return dict(zip(sizes.tolist(), counts.tolist()))
+
+    def reservoir_of(self, grid_element: Cell) -> int | None:
+        """Index of the reservoir containing an element, or None if it is not in one"""
+
+        x_coord, y_coord = grid_element
+        if not (0 <= x_coord < self._shape[0] and 0 <= y_coord < self._shape[1]):
+            return None
+        if self._membership is None:
+            self._membership = self.labels()
+        label = int(self._membership[x_coord, y_coord])
+        return None if label == 0 else label - 1
+
+    def labels(self) -> np.ndarray:
+        """Label every element of the grid with the index of its reservoir plus 1, with 0 for empty elements"""
+
+        labels = np.zeros(self._shape, dtype=np.int32)
+        labels.flat[self._flat_index] = np.repeat(np.arange(1, len(self) + 1, dtype=np.int32), self.sizes)
+        return labels
+
 
 class NetworkXMethod(GridModel):
-    def find_reservoirs(self) -> list[set[Cell]]:
+    def find_reservoirs(self) -> Reservoirs:
         """Uses a graph approach to find how many wells are needed, making the assumption that
         only one well is needed per contiguous field
 
@@ -86,63 +527,62 @@ class NetworkXMethod(GridModel):
 
         import networkx as nx
 
-        start = time.perf_counter()
-        locations_graph = nx.Graph()
-        locations_graph.add_nodes_from(self.cells)
+        with self._timed_phase(BUILD):
+            adjacency = self.adjacency()
+            locations_graph = nx.Graph()
+            locations_graph.add_nodes_from(range(adjacency.number_of_vertices))
+            locations_graph.add_edges_from(zip(adjacency.sources.tolist(), adjacency.targets.tolist()))
 
-        edges_to_create = set()
-        for node in locations_graph:
-            neighbors = self.get_neighbors(node)
-            _ = [edges_to_create.add((node, neighbor)) for neighbor in neighbors]
+        with self._timed_phase(SOLVE):
+            connected_subgraphs = list(nx.connected_components(locations_graph))
 
-        locations_graph.add_edges_from(edges_to_create)
-
-        mid = time.perf_counter()
-        connected_subgraphs = nx.connected_components(locations_graph)
-        reservoirs = list(connected_subgraphs)
-        end = time.perf_counter()
-        print(f"Build: {mid - start:.3E} s")
-        print(f"{(mid - start) / (end - start) * 100:.2f}% of total")
-        print(f"Solve: {end - mid:.3E} s")
-        print(f"{(end - mid) / (end - start) * 100:.2f}% of total")
-        return reservoirs
+        with self._timed_phase(CONVERT):
+            labels = np.empty(adjacency.number_of_vertices, dtype=np.int64)
+            for label, subgraph in enumerate(connected_subgraphs):
+                labels[list(subgraph)] = label
+            return self._reservoirs_from_vertex_labels(adjacency, labels)
 
     def __str__(self):
         return "NetworkX Method"
 
 
 class DequeMethod(GridModel):
-    def find_reservoirs(self) -> list[set[Cell]]:
+    def find_reservoirs(self) -> Reservoirs:
         """Recursively determines how many wells are needed, making the assumption that
         only one well is needed per contiguous field
         """
 
         from collections import deque
 
-        checked_elements = set()
         stack = deque()
         reservoirs = []
-        remaining_nodes = self.cells
-        while remaining_nodes:
-            reservoir = set()
-            stack.append(remaining_nodes.pop())
-            while stack:
-                location = stack.pop()
-                if location in checked_elements:
+        with self._timed_phase(BUILD):
+            remaining_nodes = self._active_padded_indices()
+            padded, flat_offsets = self._flat_neighbor_table()
+            checked_elements = bytearray(len(padded))
+        with self._timed_phase(SOLVE):
+            for start in remaining_nodes:
+                if checked_elements[start]:
                     continue
-                reservoir.add(location)
-                checked_elements.add(location)
-                stack.extend(self.get_neighbors(location))
-            reservoirs.append(reservoir)
-            remaining_nodes -= reservoir
-        return reservoirs
+                reservoir = []
+                stack.append(start)
+                while stack:
+                    location = stack.pop()
+                    if checked_elements[location]:
+                        continue
+                    reservoir.append(location)
+                    checked_elements[location] = True
+                    push_active_neighbors(padded, flat_offsets, location, stack)
+                reservoirs.append(reservoir)
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_padded_indices(reservoirs)
 
     def __str__(self):
         return "Deque Method"
 
 
 class IGraphMethod(GridModel):
-    def find_reservoirs(self) -> list[set[Cell]]:
+    def find_reservoirs(self) -> Reservoirs:
         """Uses a graph approach to find how many wells are needed, making the assumption that
         only one well is needed per contiguous field
 
@@ -151,84 +591,128 @@ class IGraphMethod(GridModel):
 
         import igraph
 
-        locations_igraph = igraph.Graph()
-        locations_str = [",".join(map(str, location)) for location in self.cells]
-        locations_igraph.add_vertices(locations_str)
-
-        edge_list = set()
-        for coords in self.cells:
-            neighbor_coords = self.get_neighbors(coords)
-            edge_list.update(
-                {
-                    (",".join(map(str, coords)), ",".join(map(str, neighbor_coord)))
-                    for neighbor_coord in neighbor_coords
-                }
-            )
-        locations_igraph.add_edges(edge_list)
-        clusters = locations_igraph.clusters(mode="STRONG")
-        wells = [
-            {
-                locations_igraph.vs[vertex]["name"] for vertex in cluster
-            }  # pylint: disable=E1136
-            for cluster in clusters
-        ]
-        return [
-            {tuple(int(value) for value in site.split(",")) for site in igraph_result}
-            for igraph_result in wells
-        ]
+        with self._timed_phase(BUILD):
+            adjacency = self.adjacency()
+            locations_igraph = igraph.Graph(n=adjacency.number_of_vertices, edges=adjacency.edges.tolist())
+        with self._timed_phase(SOLVE):
+            clusters = locations_igraph.connected_components()
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_vertex_labels(adjacency, clusters.membership)
 
 
 class RecursiveMethod(GridModel):
     checked_elements = None
+    # The recursion can go one level deep per element in a reservoir
+    recursion_limit = 1000000
 
-    def find_reservoirs(self) -> list[set[Cell]]:
-        self.checked_elements = set()
-        return self._find_reservoirs_recursive(self.cells)
-
-    def _find_reservoirs_recursive(
-        self, this_grid, reservoir=None, original_grid=None
-    ) -> list[set[Cell]]:
+    def find_reservoirs(self) -> Reservoirs:
         """Recursively determines how many wells are needed, making the assumption that
         only one well is needed per contiguous field
+        """
 
-        this_grid: This is the list of locations to be checked for the current reservoir
-        reservoir: If being called recursively, this contains the current reservoir that is being built
-        original_grid: If being called recursively, this is the full grid to find neighbor elements
+        with self._timed_phase(BUILD):
+            cells = self._active_padded_indices()
+            padded, flat_offsets = self._flat_neighbor_table()
+            self.checked_elements = bytearray(len(padded))
+        original_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(original_limit, self.recursion_limit))
+        try:
+            with self._timed_phase(SOLVE):
+                reservoirs = []
+                neighbors = []
+                for element in cells:
+                    if not self.checked_elements[element]:
+                        reservoir = []
+                        self._find_reservoirs_recursive(element, reservoir, neighbors, padded, flat_offsets)
+                        reservoirs.append(reservoir)
+        finally:
+            sys.setrecursionlimit(original_limit)
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_padded_indices(reservoirs)
+
+    def _find_reservoirs_recursive(
+        self,
+        element: int,
+        reservoir: list[int],
+        neighbors: list[int],
+        padded: bytearray,
+        flat_offsets: tuple[int, ...],
+    ):
+        """Add an element and, recursively, every unchecked element connected to it to the reservoir
+
+        element: Padded index of the element
+        reservoir: The reservoir that is being built
+        neighbors: Shared by every level of the recursion. Each level appends the neighbors it will visit and removes
+            them again before it returns, so no list is allocated per element
+        padded, flat_offsets: The neighbor table, fetched once for the whole recursion
         """
 
-        # well is None iff this is the 'outer' call of this function
-        if reservoir is None:
-            recursing = False
-            reservoir = set()
-            reservoirs = []
-            original_grid = this_grid.copy()
-        else:
-            recursing = True
-            reservoirs = None
+        self.checked_elements[element] = True
+        reservoir.append(element)
+
+        start = len(neighbors)
+        push_active_neighbors(padded, flat_offsets, element, neighbors)
+        for position in range(start, len(neighbors)):
+            neighbor = neighbors[position]
+            if not self.checked_elements[neighbor]:
+                self._find_reservoirs_recursive(neighbor, reservoir, neighbors, padded, flat_offsets)
+        del neighbors[start:]
 
-        for element in this_grid:
-            if element in self.checked_elements:
-                continue
 
-            self.checked_elements.add(element)
+class IterativeDFSMethod(GridModel):
+    def find_reservoirs(self) -> Reservoirs:
+        """Visits the elements in the same order as RecursiveMethod, giving identical results, but keeps an explicit
+        stack of frames instead of recursing, so deep reservoirs cannot overflow the interpreter's stack
 
-            # Add this location to the active well
-            reservoir.add(element)
+        The neighbors of every open frame share one list, with the frames' start positions and read positions kept on
+        two stacks of integers. This is what the recursive calls would loop over.
+        """
 
-            neighbors = self.get_neighbors(element)
-            if len(neighbors) != 0:
-                self._find_reservoirs_recursive(neighbors, reservoir, original_grid)
+        with self._timed_phase(BUILD):
+            cells = self._active_padded_indices()
+            padded, flat_offsets = self._flat_neighbor_table()
+            checked_elements = bytearray(len(padded))
 
-            # Only add the well to the return object if we are in the outer layer
-            if not recursing:
+        with self._timed_phase(SOLVE):
+            reservoirs = []
+            neighbors = []
+            frame_starts = []
+            positions = []
+            for element in cells:
+                if checked_elements[element]:
+                    continue
+
+                checked_elements[element] = True
+                reservoir = [element]
+                frame_starts.append(0)
+                positions.append(0)
+                push_active_neighbors(padded, flat_offsets, element, neighbors)
+                while positions:
+                    position = positions[-1]
+                    # Only the top frame is being read, so its neighbors run to the end of the list
+                    if position == len(neighbors):
+                        del neighbors[frame_starts.pop() :]
+                        positions.pop()
+                        continue
+                    positions[-1] = position + 1
+                    neighbor = neighbors[position]
+                    if not checked_elements[neighbor]:
+                        checked_elements[neighbor] = True
+                        reservoir.append(neighbor)
+                        frame_starts.append(len(neighbors))
+                        positions.append(len(neighbors))
+                        push_active_neighbors(padded, flat_offsets, neighbor, neighbors)
                 reservoirs.append(reservoir)
-                reservoir = set()
 
-        return reservoirs
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_padded_indices(reservoirs)
+
+    def __str__(self):
+        return "Iterative DFS Method"
 
 
 class StackMethod(GridModel):
-    def find_reservoirs(self) -> list[set[Cell]]:
+    def find_reservoirs(self) -> Reservoirs:
         """Recursively determines how many wells are needed, making the assumption that
         only one well is needed per contiguous field
 
@@ -239,70 +723,384 @@ class StackMethod(GridModel):
 
         # well is None iff this is the 'outer' call of this function
 
-        checked_elements = set()
         stack = list()
         reservoirs = []
 
-        remaining_nodes = self.cells
+        with self._timed_phase(BUILD):
+            remaining_nodes = self._active_padded_indices()
+            padded, flat_offsets = self._flat_neighbor_table()
+            checked_elements = bytearray(len(padded))
 
-        while remaining_nodes:
-            reservoir = set()
-            stack.append(remaining_nodes.pop())
+        with self._timed_phase(SOLVE):
+            for start in remaining_nodes:
+                if checked_elements[start]:
+                    continue
+                reservoir = []
+                stack.append(start)
 
-            while stack:
-                location = stack.pop()
+                while stack:
+                    location = stack.pop()
 
-                if location in checked_elements:
-                    continue
+                    if checked_elements[location]:
+                        continue
 
-                reservoir.add(location)
-                checked_elements.add(location)
+                    reservoir.append(location)
+                    checked_elements[location] = True
 
-                stack.extend(self.get_neighbors(location))
+                    push_active_neighbors(padded, flat_offsets, location, stack)
 
-            reservoirs.append(reservoir)
-            remaining_nodes -= reservoir
+                reservoirs.append(reservoir)
 
-        return reservoirs
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_padded_indices(reservoirs)
 
 
 class GraphToolMethod(GridModel):
-    def find_reservoirs(self) -> list[set[Cell]]:
+    def find_reservoirs(self) -> Reservoirs:
         """Uses a graph approach to find how many wells are needed, making the assumption that
         only one well is needed per contiguous field
 
         locations: Set containing all locations with oil
         """
 
-        raise NotImplementedError
         import graph_tool as gt
         import graph_tool.topology as topology
 
-        locations = {location: idx for idx, location in enumerate(self.cells)}
+        with self._timed_phase(BUILD):
+            adjacency = self.adjacency()
+            locations_graph = gt.Graph(directed=False)
+            locations_graph.add_vertex(adjacency.number_of_vertices)
+            locations_graph.add_edge_list(adjacency.edges)
+
+        with self._timed_phase(SOLVE):
+            components, _ = topology.label_components(locations_graph, directed=False)
+
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_vertex_labels(adjacency, components.a)
+
+    def __str__(self):
+        return "Graph-tool Method"
+
+
+class UnionFindMethod(GridModel):
+    def find_reservoirs(self) -> Reservoirs:
+        """Uses a disjoint-set forest to find how many wells are needed, making the assumption that
+        only one well is needed per contiguous field
+
+        Active elements are numbered densely and the forest is held in flat parent and rank lists, using path
+        compression and union by rank. Each element is only joined to the neighbors before it in a row-major scan.
+        """
+
+        with self._timed_phase(BUILD):
+            adjacency = self.adjacency()
+            edges = zip(adjacency.sources.tolist(), adjacency.targets.tolist())
+
+        with self._timed_phase(SOLVE):
+            parent = list(range(adjacency.number_of_vertices))
+            rank = [0] * adjacency.number_of_vertices
+            for node, neighbor in edges:
+                self._union(parent, rank, node, neighbor)
+            roots = np.array([self._find(parent, node) for node in range(len(parent))], dtype=np.int64)
+
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_vertex_labels(adjacency, roots)
+
+    @staticmethod
+    def _find(parent: list[int], node: int) -> int:
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    @classmethod
+    def _union(cls, parent: list[int], rank: list[int], first: int, second: int):
+        first_root = cls._find(parent, first)
+        second_root = cls._find(parent, second)
+        if first_root == second_root:
+            return
+        if rank[first_root] < rank[second_root]:
+            first_root, second_root = second_root, first_root
+        parent[second_root] = first_root
+        if rank[first_root] == rank[second_root]:
+            rank[first_root] += 1
+
+    def __str__(self):
+        return "Union Find Method"
+
+
+class HoshenKopelmanMethod(GridModel):
+    def find_reservoirs(self) -> Reservoirs:
+        """Labels the grid with a two-pass raster scan to find how many wells are needed, making the assumption that
+        only one well is needed per contiguous field
+        """
+
+        with self._timed_phase(SOLVE):
+            labels = self.label_grid()
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_labels(labels)
+
+    def label_grid(self) -> np.ndarray:
+        """Label every element with the number of its reservoir, counting from 1, with 0 for empty elements"""
+
+        return self.label_array(self._grid)
+
+    @classmethod
+    def label_array(cls, grid: np.ndarray) -> np.ndarray:
+        """Label the connected elements of any boolean array, which need not be square
+
+        The first pass walks the grid one row at a time. Each run of consecutive active elements in a row gets a
+        provisional label, which is merged with the labels of any runs it touches in the previous row. Only the
+        previous row's runs are kept, along with an equivalence table of provisional labels. The second pass
+        replaces each provisional label with its final label in one vectorized lookup.
+        """
+
+        labels = np.zeros(grid.shape, dtype=np.int32)
+        # Label 0 is reserved for empty elements. Roots always have a smaller label than the labels that point to them
+        parent = [0]
+
+        previous_starts = previous_ends = np.empty(0, dtype=np.int64)
+        previous_labels = []
+        for row_number, row in enumerate(grid):
+            starts, ends = find_runs(row)
+            # A run touches a run in the previous row if they overlap once the run is widened by one element each way
+            first_touching = np.searchsorted(previous_ends, starts, side="left").tolist()
+            last_touching = np.searchsorted(previous_starts, ends, side="right").tolist()
+
+            row_labels = []
+            for first, last in zip(first_touching, last_touching):
+                if first == last:
+                    label = len(parent)
+                    parent.append(label)
+                else:
+                    label = cls._find(parent, previous_labels[first])
+                    for touching in range(first + 1, last):
+                        label = cls._union(parent, label, previous_labels[touching])
+                row_labels.append(label)
+
+            labels[row_number, row] = np.repeat(row_labels, ends - starts)
+            previous_starts, previous_ends, previous_labels = starts, ends, row_labels
+
+        return cls._resolve(parent)[labels]
+
+    @staticmethod
+    def _find(parent: list[int], label: int) -> int:
+        root = label
+        while parent[root] != root:
+            root = parent[root]
+        while parent[label] != root:
+            parent[label], label = root, parent[label]
+        return root
+
+    @classmethod
+    def _union(cls, parent: list[int], first: int, second: int) -> int:
+        """Merge two labels, returning the root of the merged set, which is the smaller of the two roots"""
+
+        first_root = cls._find(parent, first)
+        second_root = cls._find(parent, second)
+        if first_root < second_root:
+            parent[second_root] = first_root
+            return first_root
+        parent[first_root] = second_root
+        return second_root
+
+    @staticmethod
+    def _resolve(parent: list[int]) -> np.ndarray:
+        """Map every provisional label to a final label, numbering the reservoirs consecutively from 1"""
+
+        # Every label points at a smaller one, so a single forward pass flattens the table
+        for label in range(len(parent)):
+            parent[label] = parent[parent[label]]
+        provisional = np.array(parent, dtype=np.int64)
+        is_root = provisional == np.arange(len(provisional))
+        final = np.cumsum(is_root) - 1
+        return final[provisional].astype(np.int32)
+
+    def __str__(self):
+        return "Hoshen-Kopelman Method"
+
+
+class ScipyMethod(GridModel):
+    # Label the components of the sparse adjacency graph rather than the grid image
+    use_csgraph: bool = False
+
+    def find_reservoirs(self) -> Reservoirs:
+        """Uses SciPy's compiled labelling to find how many wells are needed, making the assumption that
+        only one well is needed per contiguous field
+        """
+
+        if self.use_csgraph:
+            return self._find_reservoirs_csgraph()
+
+        with self._timed_phase(SOLVE):
+            labels = self.label_grid()
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_labels(labels)
+
+    def label_grid(self) -> np.ndarray:
+        """Label every element with the number of its reservoir, counting from 1, with 0 for empty elements"""
+
+        from scipy import ndimage
 
-        locations_graph = gt.Graph()
-        locations_graph.set_directed(False)
+        labels, _ = ndimage.label(self._grid, structure=np.ones((3, 3), dtype=bool))
+        return labels
 
-        locations_graph.add_vertex(len(locations))
-        locations_prop = locations_graph.new_vertex_property("object", locations)
+    def _find_reservoirs_csgraph(self) -> Reservoirs:
+        from scipy.sparse import csr_array
+        from scipy.sparse.csgraph import connected_components
 
-        edge_list = []
-        for location in locations:
-            neighbor_coords = self.get_neighbors(location)
-            edge_list.extend(
-                [
-                    (locations[location], locations[neighbor])
-                    for neighbor in neighbor_coords
-                ]
+        with self._timed_phase(BUILD):
+            adjacency = self.adjacency()
+            indptr, indices = adjacency.csr()
+            matrix = csr_array(
+                (np.ones(len(indices), dtype=np.int8), indices, indptr),
+                shape=(adjacency.number_of_vertices, adjacency.number_of_vertices),
             )
+        with self._timed_phase(SOLVE):
+            _, labels = connected_components(matrix, directed=False)
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_vertex_labels(adjacency, labels)
+
+    def __str__(self):
+        if self.use_csgraph:
+            return "SciPy csgraph Method"
+        return "SciPy ndimage Method"
+
+
+class IncrementalMethod(GridModel):
+    def __init__(
+        self,
+        size: int,
+        location_probability: float = THRESHOLD,
+        seed: float = None,
+        grid: np.ndarray = None,
+    ):
+        """A model that keeps its reservoirs up to date as elements are added and removed, so that re-surveying a
+        few elements does not mean solving the whole grid again
+
+        Reservoirs are held as a union-find over the padded indices of the active elements, along with the set of
+        members of each root. Adding an element unions it with its neighbors. Removing one re-floods only the
+        reservoir it was in, which may split it.
+        """
+        super().__init__(size, location_probability, seed, grid)
+        self._parent: dict[int, int] | None = None
+        self._members: dict[int, set[int]] = {}
+
+    @property
+    def number_of_reservoirs(self) -> int:
+        self._build_index()
+        return len(self._members)
 
-        locations_graph.add_edge_list(edge_list)
+    def find_reservoirs(self) -> Reservoirs:
+        """Reads the reservoirs straight from the maintained index, making the assumption that
+        only one well is needed per contiguous field
+        """
 
-        components, _ = topology.label_components(locations_graph, directed=False)
-        wells = dict()
-        for vertex, label in enumerate(components.a):
-            if label not in wells:
-                wells[label] = []
-            wells[label].append(locations_prop[vertex])
+        # Only the first call does any solving, later calls reuse the maintained index
+        with self._timed_phase(SOLVE):
+            self._build_index()
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_padded_indices(list(self._members.values()))
+
+    def add_cell(self, grid_element: Cell):
+        self._build_index()
+        if self._is_active(grid_element):
+            return
+        super().add_cell(grid_element)
+
+        index = self._padded_index(grid_element)
+        self._parent[index] = index
+        self._members[index] = {index}
+        neighbors = []
+        push_active_neighbors(*self._flat_neighbor_table(), index, neighbors)
+        for neighbor in neighbors:
+            self._union(index, neighbor)
+
+    def remove_cell(self, grid_element: Cell):
+        self._build_index()
+        if not self._is_active(grid_element):
+            return
+        super().remove_cell(grid_element)
+
+        index = self._padded_index(grid_element)
+        remaining = self._members.pop(self._find(index))
+        remaining.discard(index)
+        del self._parent[index]
+        neighbors = []
+        push_active_neighbors(*self._flat_neighbor_table(), index, neighbors)
+
+        # Flood out from each neighbor in turn. If a flood reaches all of the other neighbors, whatever has not been
+        # split off yet is still connected
+        for position, neighbor in enumerate(neighbors):
+            if neighbor not in remaining:
+                continue
+            targets = [target for target in neighbors[position + 1 :] if target in remaining]
+            if not targets:
+                break
+            piece = self._flood(neighbor, targets)
+            if piece is None:
+                break
+            self._add_reservoir(piece)
+            remaining -= piece
+        if remaining:
+            self._add_reservoir(remaining)
+
+    def _build_index(self):
+        if self._parent is not None:
+            return
+        self._neighbor_table()
+        self._parent = {}
+        self._members = {}
+        labels = HoshenKopelmanMethod.label_array(self._grid)
+        width = self._grid.shape[1] + 2
+        reservoirs = self._reservoirs_from_labels(labels)
+        for reservoir in reservoirs:
+            self._add_reservoir({(x_coord + 1) * width + y_coord + 1 for x_coord, y_coord in reservoir})
+
+    def _add_reservoir(self, members: set[int]):
+        root = next(iter(members))
+        for member in members:
+            self._parent[member] = root
+        self._members[root] = members
+
+    def _flood(self, start: int, targets: list[int]) -> set[int] | None:
+        """Collect the reservoir containing start, or return None as soon as every target has been reached"""
+
+        padded, flat_offsets = self._flat_neighbor_table()
+        outstanding = set(targets)
+        visited = set()
+        stack = [start]
+        while stack:
+            index = stack.pop()
+            if index in visited:
+                continue
+            visited.add(index)
+            outstanding.discard(index)
+            if not outstanding:
+                return None
+            push_active_neighbors(padded, flat_offsets, index, stack)
+        return visited
+
+    def _find(self, index: int) -> int:
+        parent = self._parent
+        root = index
+        while parent[root] != root:
+            root = parent[root]
+        while parent[index] != root:
+            parent[index], index = root, parent[index]
+        return root
+
+    def _union(self, first: int, second: int):
+        """Merge two reservoirs, moving the members of the smaller one into the larger"""
+
+        first_root, second_root = self._find(first), self._find(second)
+        if first_root == second_root:
+            return
+        if len(self._members[first_root]) < len(self._members[second_root]):
+            first_root, second_root = second_root, first_root
+        self._parent[second_root] = first_root
+        self._members[first_root] |= self._members.pop(second_root)
 
-        return [set(well) for well in wells.values()]
+    def __str__(self):
+        return "Incremental Method"
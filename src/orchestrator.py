@@ -1,28 +1,93 @@
+from collections import OrderedDict
 from typing import TypeVar, Type
 
+import numpy as np
+
+from cache import DiskGridCache
 from view import GridView
 
 Grid_Model = TypeVar(name="Grid_Model", covariant=True)
 
 
+class CachedGrid:
+    def __init__(self, cells: np.ndarray, phase_times: dict[str, float], phase_peak_memory: dict[str, int]):
+        """A clustered grid shared by every model type, with the cost of building it
+
+        The cells are made read-only, so a model that changes its grid takes its own copy first.
+        """
+        cells.flags.writeable = False
+        self.cells = cells
+        self.phase_times = phase_times
+        self.phase_peak_memory = phase_peak_memory
+
+    @property
+    def nbytes(self) -> int:
+        return self.cells.nbytes
+
+
 class GridOrchestrator:
-    registry: dict[tuple, Grid_Model] = {}
+    # Keyed by (grid size, location probability, seed) and kept in least recently used order
+    registry: "OrderedDict[tuple, CachedGrid]" = OrderedDict()
+    # Upper limit on the total size of the grids in the registry, or None for no limit
+    max_cache_bytes: int | None = None
+    # When set, clustered grids with a seed are stored on disk and memory-mapped on later runs
+    disk_cache: DiskGridCache | None = None
 
     @classmethod
     def get_grid_view_with_parameters(
-        cls, grid_size: int, location_probability: float, model_type: Type
+        cls, grid_size: int, location_probability: float, model_type: Type, seed: float = None
     ) -> GridView:
-        grid = cls._get_grid(grid_size, location_probability, model_type)
+        grid = cls._get_grid(grid_size, location_probability, model_type, seed)
         return GridView(grid)
 
     @classmethod
     def _get_grid(
-        cls, grid_size: int, location_probability: float, model_type: Type
+        cls, grid_size: int, location_probability: float, model_type: Type, seed: float = None
     ) -> Grid_Model:
-        key = (grid_size, location_probability)
+        key = (grid_size, location_probability, seed)
         if key in cls.registry:
-            return cls.registry[key]
+            cls.registry.move_to_end(key)
+            cached = cls.registry[key]
         else:
-            grid = model_type(size=grid_size, location_probability=location_probability)
-            cls.registry[key] = grid
+            cached = cls._build_grid(grid_size, location_probability, model_type, seed)
+            cls._store(key, cached)
+
+        grid = model_type(
+            size=grid_size, location_probability=location_probability, seed=seed, grid=cached.cells
+        )
+        grid.phase_times.update(cached.phase_times)
+        grid.phase_peak_memory.update(cached.phase_peak_memory)
         return grid
+
+    @classmethod
+    def _build_grid(
+        cls, grid_size: int, location_probability: float, model_type: Type, seed: float = None
+    ) -> CachedGrid:
+        # Every model type generates the same grid, so whichever asked first builds it
+        built = []
+
+        def create() -> np.ndarray:
+            built.append(model_type(size=grid_size, location_probability=location_probability, seed=seed))
+            return built[0].grid
+
+        if cls.disk_cache is None:
+            cells = create()
+        else:
+            cells = cls.disk_cache.get_or_create(grid_size, location_probability, seed, create)
+
+        if not built:
+            # Loaded from disk, so there was nothing to time
+            return CachedGrid(cells, {}, {})
+        return CachedGrid(cells, dict(built[0].phase_times), dict(built[0].phase_peak_memory))
+
+    @classmethod
+    def _store(cls, key: tuple, cached: CachedGrid):
+        """Add a grid to the registry, evicting the least recently used grids to stay within max_cache_bytes"""
+
+        if cls.max_cache_bytes is not None and cached.nbytes > cls.max_cache_bytes:
+            return
+        cls.registry[key] = cached
+        if cls.max_cache_bytes is None:
+            return
+        while sum(grid.nbytes for grid in cls.registry.values()) > cls.max_cache_bytes:
+            cls.registry.popitem(last=False)
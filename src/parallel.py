@@ -0,0 +1,216 @@
+""" Find reservoirs by labelling horizontal tiles of the grid in separate processes
+The grid and the label array live in shared memory, so workers never pickle cells. Reservoirs that cross the seams
+between tiles are joined afterwards with a small union-find over the labels either side of each seam.
+The process pool and shared memory are kept for the life of the model, so repeated runs only pay for them once.
+"""
+
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator
+
+import numpy as np
+
+from src.model import GridModel, HoshenKopelmanMethod, Reservoirs, BUILD, SOLVE, CONVERT
+
+
+@contextmanager
+def _shared_array(name: str, shape: tuple, dtype: type) -> Iterator[np.ndarray]:
+    """Attach to an existing shared memory block as an array"""
+
+    memory = SharedMemory(name=name)
+    try:
+        array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+        yield array
+        # The view must go before the block can be closed
+        del array
+    finally:
+        memory.close()
+
+
+def _label_tile(
+    grid_name: str, labels_name: str, shape: tuple, start: int, stop: int
+) -> int:
+    """Label one tile in place with labels counting from 1 and return the number of labels used"""
+
+    with _shared_array(grid_name, shape, bool) as grid:
+        with _shared_array(labels_name, shape, np.int32) as labels:
+            labels[start:stop] = HoshenKopelmanMethod.label_array(grid[start:stop])
+            return int(labels[start:stop].max(initial=0))
+
+
+def _worker_ready():
+    """Does nothing, so that submitting it starts a worker process"""
+
+
+def _release(executor: ProcessPoolExecutor, memories: list[SharedMemory]):
+    executor.shutdown()
+    for memory in memories:
+        memory.close()
+        memory.unlink()
+
+
+def _relabel_tile(
+    labels_name: str, lookup_name: str, shape: tuple, lookup_size: int, start: int, stop: int, offset: int
+):
+    """Replace the labels of one tile using a shared lookup table indexed by global label"""
+
+    with _shared_array(labels_name, shape, np.int32) as labels:
+        with _shared_array(lookup_name, (lookup_size,), np.int32) as lookup:
+            tile = labels[start:stop]
+            tile[:] = lookup[np.where(tile > 0, tile + offset, 0)]
+            del tile
+
+
+class TileParallelMethod(GridModel):
+    # Number of worker processes, defaulting to one per CPU available to this process
+    workers: int = None
+    # Splitting the grid into more tiles than workers evens out the load
+    tiles_per_worker: int = 4
+    _executor: ProcessPoolExecutor = None
+
+    def find_reservoirs(self) -> Reservoirs:
+        """Labels tiles of the grid in a process pool to find how many wells are needed, making the assumption that
+        only one well is needed per contiguous field
+
+        Starting the pool on the first run and copying the grid into shared memory are timed as the Build phase.
+        """
+
+        with self._timed_phase(BUILD):
+            self._start_workers()
+            self._share_grid()
+        with self._timed_phase(SOLVE):
+            labels = self._label_shared_grid()
+        with self._timed_phase(CONVERT):
+            return self._reservoirs_from_labels(labels)
+
+    def label_grid(self) -> np.ndarray:
+        """Label every element with the number of its reservoir, counting from 1, with 0 for empty elements"""
+
+        self._start_workers()
+        self._share_grid()
+        return self._label_shared_grid()
+
+    def close(self):
+        """Stop the worker processes and free the shared memory. They are started again if the model is used again"""
+
+        if self._executor is not None:
+            self._finalizer()
+            self._executor = None
+
+    def _start_workers(self):
+        """Start the process pool and allocate the shared grid and labels, once for the life of the model"""
+
+        if self._executor is not None:
+            return
+        workers = self.workers or self._available_cpus()
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._grid_memory = SharedMemory(create=True, size=max(self._grid.nbytes, 1))
+        self._labels_memory = SharedMemory(create=True, size=max(self._grid.size * 4, 1))
+        # Free everything when the model is garbage collected, in case close is never called
+        self._finalizer = weakref.finalize(
+            self, _release, self._executor, [self._grid_memory, self._labels_memory]
+        )
+        # Processes start on demand, so start them all now rather than inside the first timed solve
+        for future in [self._executor.submit(_worker_ready) for _ in range(workers)]:
+            future.result()
+
+    def _share_grid(self):
+        """Copy the grid into shared memory, which is repeated every run because the grid may have changed"""
+        np.ndarray(self._grid.shape, dtype=bool, buffer=self._grid_memory.buf)[:] = self._grid
+
+    def _label_shared_grid(self) -> np.ndarray:
+        shape = self._grid.shape
+        workers = self.workers or self._available_cpus()
+        boundaries = np.linspace(0, self.size, min(self.size, workers * self.tiles_per_worker) + 1, dtype=int)
+        tiles = [(int(start), int(stop)) for start, stop in zip(boundaries[:-1], boundaries[1:]) if stop > start]
+        if not tiles:
+            return np.zeros(shape, dtype=np.int32)
+
+        grid_name, labels_name = self._grid_memory.name, self._labels_memory.name
+        labels = np.ndarray(shape, dtype=np.int32, buffer=self._labels_memory.buf)
+        counts = list(
+            self._executor.map(
+                _label_tile, *zip(*[(grid_name, labels_name, shape, start, stop) for start, stop in tiles])
+            )
+        )
+
+        # Each tile numbers its labels from 1, so shift them into one range covering the whole grid
+        offsets = np.cumsum([0] + counts[:-1]).tolist()
+        lookup_size = sum(counts) + 1
+        lookup_memory = SharedMemory(create=True, size=lookup_size * 4)
+        try:
+            lookup = np.ndarray((lookup_size,), dtype=np.int32, buffer=lookup_memory.buf)
+            lookup[:] = self._merge_seams(labels, tiles, offsets, lookup_size)
+            list(
+                self._executor.map(
+                    _relabel_tile,
+                    *zip(
+                        *[
+                            (labels_name, lookup_memory.name, shape, lookup_size, start, stop, offset)
+                            for (start, stop), offset in zip(tiles, offsets)
+                        ]
+                    ),
+                )
+            )
+            result = labels.copy()
+            del labels, lookup
+            return result
+        finally:
+            lookup_memory.close()
+            lookup_memory.unlink()
+
+    @staticmethod
+    def _available_cpus() -> int:
+        """Number of CPUs this process may run on, which is fewer than the machine has when it is pinned"""
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    @staticmethod
+    def _merge_seams(
+        labels: np.ndarray, tiles: list[tuple[int, int]], offsets: list[int], lookup_size: int
+    ) -> np.ndarray:
+        """Build a table mapping global labels, which are each tile's labels shifted by its offset, to final labels
+        numbered consecutively from 1
+
+        Only the rows either side of each seam are read, and only the labels found there enter the union-find.
+        """
+
+        parent: dict[int, int] = {}
+
+        def find(label: int) -> int:
+            parent.setdefault(label, label)
+            root = label
+            while parent[root] != root:
+                root = parent[root]
+            while parent[label] != root:
+                parent[label], label = root, parent[label]
+            return root
+
+        for tile_number in range(1, len(tiles)):
+            seam = tiles[tile_number][0]
+            above = labels[seam - 1].astype(np.int64)
+            below = labels[seam].astype(np.int64)
+            above[above > 0] += offsets[tile_number - 1]
+            below[below > 0] += offsets[tile_number]
+            for y_offset in (-1, 0, 1):
+                upper = above[max(0, -y_offset) : len(above) - max(0, y_offset)]
+                lower = below[max(0, y_offset) : len(below) - max(0, -y_offset)]
+                touching = (upper > 0) & (lower > 0)
+                for first, second in set(zip(upper[touching].tolist(), lower[touching].tolist())):
+                    first_root, second_root = find(first), find(second)
+                    if first_root != second_root:
+                        parent[max(first_root, second_root)] = min(first_root, second_root)
+
+        # Map every global label to its root, then number the roots consecutively
+        roots = np.arange(lookup_size)
+        for label in list(parent):
+            roots[label] = find(label)
+        is_root = roots == np.arange(lookup_size)
+        return (np.cumsum(is_root) - 1)[roots].astype(np.int32)
+
+    def __str__(self):
+        return "Tile Parallel Method"
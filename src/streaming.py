@@ -0,0 +1,110 @@
+""" Find reservoirs in grids that are too big to hold in memory
+The grid is consumed one strip of rows at a time, and each reservoir is reported as soon as the scan has moved past
+its last row
+"""
+
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from src.model import THRESHOLD, Cell, cluster_strips, find_runs, generate_strips
+
+
+class StreamingReservoirFinder:
+    def __init__(self, strips: Iterable[np.ndarray]):
+        """Scan a clustered grid that arrives as boolean strips of whole rows, indexed by [x, y]
+
+        strips: Any iterable of 2D arrays, e.g. slices of a memory-mapped file. It is only iterated once.
+        """
+        self._strips = strips
+
+    @classmethod
+    def from_parameters(
+        cls, size: int, location_probability: float = THRESHOLD, seed: float = None
+    ) -> "StreamingReservoirFinder":
+        """Generate and cluster the grid on the fly, giving the same grid as GridModel for the same parameters"""
+
+        if location_probability is None:
+            location_probability = THRESHOLD
+        return cls(cluster_strips(generate_strips(size, location_probability, seed)))
+
+    def reservoir_sizes(self) -> Iterator[int]:
+        for size, _ in self._scan(collect_cells=False):
+            yield size
+
+    def reservoirs(self) -> Iterator[set[Cell]]:
+        """Yield each reservoir's elements. Memory use grows with the largest reservoir rather than the grid"""
+
+        for _, runs in self._scan(collect_cells=True):
+            yield {(x_coord, y_coord) for x_coord, start, end in runs for y_coord in range(start, end)}
+
+    def count_reservoirs(self) -> int:
+        return sum(1 for _ in self._scan(collect_cells=False))
+
+    def _rows(self) -> Iterator[np.ndarray]:
+        for strip in self._strips:
+            yield from strip
+
+    def _scan(self, collect_cells: bool) -> Iterator[tuple[int, Optional[list]]]:
+        """Label each row's runs against the runs of the row before, in the manner of HoshenKopelmanMethod
+
+        Only the previous row's runs and the labels that are still open are kept. At the end of every row the
+        equivalence table is rebuilt with just the labels present in that row, and any label that did not reach the
+        row is finished and yielded as (size, runs), where runs is a list of (x, start, end) or None.
+        """
+
+        parent: dict[int, int] = {}
+        sizes: dict[int, int] = {}
+        runs: dict[int, list] = {}
+        next_label = 0
+
+        def find(label: int) -> int:
+            root = label
+            while parent[root] != root:
+                root = parent[root]
+            while parent[label] != root:
+                parent[label], label = root, parent[label]
+            return root
+
+        def union(first: int, second: int) -> int:
+            first_root, second_root = find(first), find(second)
+            if first_root == second_root:
+                return first_root
+            if sizes[first_root] < sizes[second_root]:
+                first_root, second_root = second_root, first_root
+            parent[second_root] = first_root
+            sizes[first_root] += sizes.pop(second_root)
+            if collect_cells:
+                runs[first_root].extend(runs.pop(second_root))
+            return first_root
+
+        previous_starts = previous_ends = np.empty(0, dtype=np.int64)
+        previous_labels = []
+        for row_number, row in enumerate(self._rows()):
+            starts, ends = find_runs(row)
+            first_touching = np.searchsorted(previous_ends, starts, side="left").tolist()
+            last_touching = np.searchsorted(previous_starts, ends, side="right").tolist()
+            lengths = (ends - starts).tolist()
+
+            row_labels = []
+            for run_number, (first, last) in enumerate(zip(first_touching, last_touching)):
+                label = next_label
+                next_label += 1
+                parent[label] = label
+                sizes[label] = lengths[run_number]
+                if collect_cells:
+                    runs[label] = [(row_number, int(starts[run_number]), int(ends[run_number]))]
+                for touching in range(first, last):
+                    label = union(label, previous_labels[touching])
+                row_labels.append(label)
+
+            row_roots = [find(label) for label in row_labels]
+            open_roots = set(row_roots)
+            for root in {find(label) for label in previous_labels} - open_roots:
+                yield sizes.pop(root), runs.pop(root, None)
+
+            parent = {root: root for root in open_roots}
+            previous_starts, previous_ends, previous_labels = starts, ends, row_roots
+
+        for root in set(previous_labels):
+            yield sizes.pop(root), runs.pop(root, None)
@@ -1,7 +1,24 @@
+import io
+import os
+import struct
+import sys
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, TextIO
+
 import colorama
 import lxml.etree as ET
+import numpy as np
+
+from src.model import GridModel, Cell, HoshenKopelmanMethod
 
-from src.model import GridModel, Cell
+# Number of grid elements serialized per write when streaming XML
+XML_CHUNK_SIZE = 1 << 16
+# Widest table AsciiGrid draws before it starts downsampling
+MAX_RENDERED_CELLS = 100
+# Number of image rows converted and compressed at a time when writing images
+IMAGE_CHUNK_ROWS = 1024
 
 
 class GridView:
@@ -17,7 +34,7 @@ class GridView:
 
     @property
     def number_of_sites(self) -> int:
-        return len(self._grid.cells)
+        return self._grid.number_of_cells
 
     @property
     def density(self) -> float:
@@ -37,6 +54,14 @@ class GridView:
     def get_reservoirs(self):
         return self._grid.find_reservoirs()
 
+    @property
+    def phase_times(self) -> dict[str, float]:
+        return self._grid.phase_times
+
+    @property
+    def phase_peak_memory(self) -> dict[str, int]:
+        return self._grid.phase_peak_memory
+
     @property
     def to_xml(self) -> ET.Element:
         root = ET.Element("grid")
@@ -51,12 +76,222 @@ class GridView:
             root.append(location_element)
         return root
 
-    def to_ascii_art(self):
-        """Render the grid. Relies on a fixed-width font."""
+    def write_xml(self, destination: str | os.PathLike | BinaryIO):
+        """Stream the grid to a file in the same schema as to_xml without building a document in memory"""
+        write_grid_xml(self._grid.grid, destination)
+
+    def reservoir_labels(self) -> np.ndarray:
+        """Label every element with the number of its reservoir, counting from 1, with 0 for empty elements
+
+        The labels come from a fresh labelling of the grid, so the model's own phase timings are left alone.
+        """
+        return HoshenKopelmanMethod.label_array(self._grid.grid)
+
+    def to_ascii_art(
+        self,
+        stream: TextIO = None,
+        origin: Cell = (0, 0),
+        window: int = None,
+        step: int = None,
+        colour_reservoirs: bool = True,
+    ):
+        """Render the grid to a stream, stdout by default. Relies on a fixed-width font.
+
+        Big grids are downsampled to fit, or pass origin and window to look at part of one. See AsciiGrid.
+        """
+
+        stream = stream or sys.stdout
+        ascii_table = AsciiGrid(
+            self._grid.grid,
+            self._grid.size,
+            origin=origin,
+            window=window,
+            step=step,
+            colour_reservoirs=colour_reservoirs,
+        )
+        ascii_table.write(stream)
+        stream.write(AsciiGrid.NEWLINE)
+
+    def write_image(
+        self,
+        destination: str | os.PathLike,
+        reservoirs: bool = False,
+        step: int = 1,
+        tile_size: int = None,
+        labels: np.ndarray = None,
+    ) -> list[Path]:
+        """Write the grid as an image with one pixel per element, x across and y down, and return the paths written
+
+        The format follows the suffix: .png, or .pgm/.ppm for the binary Netpbm formats.
+
+        reservoirs: Colour each reservoir in its own colour, instead of writing the active elements in white
+        step: Draw each step x step block of elements as one pixel, set if any element in it is
+        tile_size: Split the grid into square tiles of this many elements, written to files named
+            <stem>_<x>_<y><suffix> after the first element in each tile
+        labels: Reservoir labels to colour by, such as Reservoirs.labels() of a result already found. Without them,
+            the grid is labelled again
+        """
+        path = Path(destination)
+        if not reservoirs:
+            values = self._grid.grid
+        elif labels is not None:
+            values = labels
+        else:
+            values = self.reservoir_labels()
+        if tile_size is None:
+            write_image(values, path, colour=reservoirs, step=step)
+            return [path]
+
+        paths = []
+        for x_origin in range(0, self.size, tile_size):
+            for y_origin in range(0, self.size, tile_size):
+                tile_path = path.with_name(f"{path.stem}_{x_origin}_{y_origin}{path.suffix}")
+                tile = values[x_origin : x_origin + tile_size, y_origin : y_origin + tile_size]
+                write_image(tile, tile_path, colour=reservoirs, step=step)
+                paths.append(tile_path)
+        return paths
+
+
+@contextmanager
+def _open_binary(target: str | os.PathLike | BinaryIO, mode: str) -> Iterator[BinaryIO]:
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, mode) as file:
+            yield file
+    else:
+        yield target
+
+
+def write_grid_xml(grid: np.ndarray, destination: str | os.PathLike | BinaryIO):
+    """Write <grid><el><x/><y/></el>...</grid> for the active elements of a grid in sorted order
+
+    The rows are walked in order, which sorts the elements for free, and the text is written a chunk at a time, so
+    memory use does not grow with the grid.
+    """
+    with _open_binary(destination, "wb") as file:
+        file.write(b"<?xml version='1.0' encoding='UTF-8'?>\n<grid>")
+        chunk = []
+        chunk_length = 0
+        for x_coord, row in enumerate(grid):
+            y_coords = np.flatnonzero(row)
+            if not len(y_coords):
+                continue
+            chunk.append("".join([f"<el><x>{x_coord}</x><y>{y_coord}</y></el>" for y_coord in y_coords.tolist()]))
+            chunk_length += len(y_coords)
+            if chunk_length >= XML_CHUNK_SIZE:
+                file.write("".join(chunk).encode())
+                chunk = []
+                chunk_length = 0
+        file.write("".join(chunk).encode())
+        file.write(b"</grid>\n")
+
+
+def read_grid_xml(source: str | os.PathLike | BinaryIO, size: int = None) -> np.ndarray:
+    """Load a grid written by write_grid_xml or to_xml, parsing one element at a time
+
+    size: The length of one edge of the grid. If not given, it is taken from the largest coordinate, which means
+        holding every coordinate until the end of the file
+    """
+    with _open_binary(source, "rb") as file:
+        if size is not None:
+            grid = np.zeros((size, size), dtype=bool)
+            for x_coord, y_coord in _iter_xml_elements(file):
+                grid[x_coord, y_coord] = True
+            return grid
+
+        coords = np.array(list(_iter_xml_elements(file)), dtype=np.int64).reshape(-1, 2)
+    size = int(coords.max()) + 1 if len(coords) else 0
+    grid = np.zeros((size, size), dtype=bool)
+    grid[coords[:, 0], coords[:, 1]] = True
+    return grid
+
+
+def _iter_xml_elements(file: BinaryIO) -> Iterator[Cell]:
+    for _, element in ET.iterparse(file, tag="el"):
+        first, second = element
+        if first.tag == "x":
+            yield int(first.text), int(second.text)
+        else:
+            yield int(second.text), int(first.text)
+        # Drop the element and anything before it, so the tree never grows
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def downsample(values: np.ndarray, step: int) -> np.ndarray:
+    """Reduce each step x step block of a 2D array to its largest value, keeping partial blocks at the edges"""
+
+    if step == 1:
+        return values
+    starts = np.arange(0, max(values.shape), step)
+    if not values.size:
+        return values[::step, ::step]
+    rows = np.maximum.reduceat(values, starts[starts < values.shape[0]], axis=0)
+    return np.maximum.reduceat(rows, starts[starts < values.shape[1]], axis=1)
+
+
+def label_colours(labels: np.ndarray) -> np.ndarray:
+    """Give every label a fixed, bright RGB colour derived from its value, with black for label 0"""
+
+    hashed = labels.astype(np.uint32) * np.uint32(2654435761)
+    colours = np.stack([hashed >> 8, hashed >> 16, hashed >> 24], axis=-1).astype(np.uint8) | 0x40
+    colours[labels == 0] = 0
+    return colours
+
+
+def write_image(values: np.ndarray, destination: str | os.PathLike, colour: bool = False, step: int = 1):
+    """Write a 2D array indexed by [x, y] as a PNG, PGM or PPM image, following the suffix of the destination
+
+    colour: Treat the values as labels and draw each in its own colour. Otherwise any nonzero value is white
+    step: Draw each step x step block of elements as one pixel
+
+    The image is converted and compressed IMAGE_CHUNK_ROWS rows at a time, so memory use is bounded by the chunk
+    size rather than the grid.
+    """
+    values = downsample(values, step)
+    width, height = values.shape
+    suffix = Path(destination).suffix.lower()
+
+    def row_chunks() -> Iterator[np.ndarray]:
+        for start in range(0, height, IMAGE_CHUNK_ROWS):
+            chunk = values[:, start : start + IMAGE_CHUNK_ROWS].T
+            yield label_colours(chunk) if colour else np.where(chunk != 0, 255, 0).astype(np.uint8)
+
+    with open(destination, "wb") as file:
+        if suffix == ".png":
+            _write_png(file, width, height, 3 if colour else 1, row_chunks())
+        elif suffix in (".pgm", ".ppm"):
+            if colour != (suffix == ".ppm"):
+                raise ValueError("Reservoir colours need a .ppm file, and a plain mask a .pgm file")
+            file.write(b"P6" if colour else b"P5")
+            file.write(f"\n{width} {height}\n255\n".encode())
+            for chunk in row_chunks():
+                file.write(chunk.tobytes())
+        else:
+            raise ValueError(f"Unsupported image format: {suffix}")
+
+
+def _write_png(file: BinaryIO, width: int, height: int, channels: int, row_chunks: Iterable[np.ndarray]):
+    """Write 8-bit greyscale or RGB rows as a PNG, with one IDAT chunk per compressed block"""
 
-        # Use the size of the grid to figure out how much to pad row and column indices by
-        ascii_table = AsciiGrid(self._grid.cells, self._grid.size).draw()
-        print(ascii_table)
+    def write_chunk(chunk_type: bytes, data: bytes):
+        file.write(struct.pack(">I", len(data)) + chunk_type + data)
+        file.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+    file.write(b"\x89PNG\r\n\x1a\n")
+    colour_type = 2 if channels == 3 else 0
+    write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, colour_type, 0, 0, 0))
+    # Fast compression, since random reservoir colours barely compress anyway
+    compressor = zlib.compressobj(1)
+    for chunk in row_chunks:
+        # Every row starts with a filter type byte, which is 0 for no filtering
+        rows = np.zeros((len(chunk), width * channels + 1), dtype=np.uint8)
+        rows[:, 1:] = chunk.reshape(len(chunk), -1)
+        data = compressor.compress(rows.tobytes())
+        if data:
+            write_chunk(b"IDAT", data)
+    write_chunk(b"IDAT", compressor.flush())
+    write_chunk(b"IEND", b"")
 
 
 class AsciiGrid:
@@ -73,38 +308,115 @@ class AsciiGrid:
     VERTEX_CHAR = u"\u253c"
     NEWLINE = "\n"
 
-    def __init__(self, grid: set[Cell], grid_size: int, horizontal_lines: bool = False):
-        self.cells = grid
-        self.grid_size = grid_size
-        self.coord_list = list(range(0, self.grid_size))  # Square grid only, so a single list of coords
-        self.num_chars_in_label = len(str(grid_size - 1))
+    # Reservoirs cycle through these colours in label order
+    COLOURS = (
+        colorama.Fore.RED,
+        colorama.Fore.GREEN,
+        colorama.Fore.YELLOW,
+        colorama.Fore.BLUE,
+        colorama.Fore.MAGENTA,
+        colorama.Fore.CYAN,
+        colorama.Fore.LIGHTRED_EX,
+        colorama.Fore.LIGHTGREEN_EX,
+        colorama.Fore.LIGHTYELLOW_EX,
+        colorama.Fore.LIGHTBLUE_EX,
+        colorama.Fore.LIGHTMAGENTA_EX,
+        colorama.Fore.LIGHTCYAN_EX,
+    )
+
+    def __init__(
+        self,
+        grid: set[Cell] | np.ndarray,
+        grid_size: int,
+        horizontal_lines: bool = False,
+        origin: Cell = (0, 0),
+        window: int = None,
+        step: int = None,
+        colour_reservoirs: bool = False,
+    ):
+        """Render a square grid, or a square window onto it, as a table with one column per x and one row per y
+
+        grid: The active elements, as a set of cells or a boolean array indexed by [x, y]
+        origin: The (x, y) of the first element shown
+        window: Number of elements shown along each edge, defaulting to the rest of the grid
+        step: Draw each step x step block of elements as one character, active if any element in it is. Defaults to
+            the smallest step that fits the window into MAX_RENDERED_CELLS columns
+        colour_reservoirs: Draw each reservoir in its own colour. Otherwise every active element is red. Only the
+            characters drawn, plus a border of one character, are labelled, so the cost does not grow with the grid.
+            Reservoirs that only meet outside that area get different colours
+        """
+        if not isinstance(grid, np.ndarray):
+            cells = grid
+            grid = np.zeros((grid_size, grid_size), dtype=bool)
+            if cells:
+                grid[tuple(zip(*cells))] = True
+
+        x_origin, y_origin = origin
+        if window is None:
+            window = grid_size - max(x_origin, y_origin)
+        window = max(0, min(window, grid_size - x_origin, grid_size - y_origin))
+        if step is None:
+            step = max(1, -(-window // MAX_RENDERED_CELLS))
+        self.step = step
         self.horizontal_lines = horizontal_lines
 
+        # Add a border of one block where there is room for a whole one, so that the blocks stay aligned
+        x_border = step if x_origin >= step else 0
+        y_border = step if y_origin >= step else 0
+        region = downsample(
+            grid[x_origin - x_border : x_origin + window + step, y_origin - y_border : y_origin + window + step], step
+        )
+        if colour_reservoirs:
+            region = HoshenKopelmanMethod.label_array(region)
+        else:
+            region = region.astype(np.int32)
+        blocks = -(-window // step)
+        region = region[x_border // step : x_border // step + blocks, y_border // step : y_border // step + blocks]
+
+        self.column_coords = (x_origin + np.arange(blocks) * step).tolist()
+        self.row_coords = (y_origin + np.arange(blocks) * step).tolist()
+        self.num_chars_in_label = len(str(max(self.column_coords + self.row_coords, default=grid_size - 1)))
+
+        # Rows of the table run along y, so transpose to [y, x] and map each label to its colour
+        self._colour_index = np.where(region.T > 0, (region.T - 1) % len(self.COLOURS) + 1, 0)
+        self._cell_strings = np.array(
+            [" " * self.num_chars_in_label + self.VERTICAL_CHAR]
+            + [
+                colour + "x" * self.num_chars_in_label + colorama.Style.RESET_ALL + self.VERTICAL_CHAR
+                for colour in self.COLOURS
+            ],
+            dtype=object,
+        )
+
+    @property
+    def number_of_columns(self) -> int:
+        return len(self.column_coords)
+
     def draw(self) -> str:
-        if self.grid_size > 100:
-            return "Too big to render!"
+        output = io.StringIO()
+        self.write(output)
+        return output.getvalue()
 
-        result = self._top_row()
-        result += "".join([self._data_row(row_number) for row_number in self.coord_list])
-        result += self._bottom_line()
-        return result
+    def write(self, stream: TextIO):
+        """Write the table to a text stream one line at a time, so no more than a row is ever held in memory"""
 
-    def _top_row(self) -> str:
-        return self._top_line() + self.NEWLINE + self._table_header() + self.NEWLINE
+        stream.write(self._top_line() + self.NEWLINE)
+        stream.write(self._table_header() + self.NEWLINE)
+        for row_number in range(len(self.row_coords)):
+            stream.write(self._data_row(row_number))
+        stream.write(self._bottom_line())
 
     def _top_line(self) -> str:
         top_line = (
             self.TOP_LEFT_CHAR
-            + (self.HORIZ_CHAR * self.num_chars_in_label + self.TOP_CHAR) * self.grid_size
+            + (self.HORIZ_CHAR * self.num_chars_in_label + self.TOP_CHAR) * self.number_of_columns
             + self.HORIZ_CHAR * self.num_chars_in_label
             + self.TOP_RIGHT_CHAR
         )
         return top_line
 
     def _table_header(self) -> str:
-        column_heading_numbers = [
-            str(y).zfill(self.num_chars_in_label) for y in list(range(0, self.grid_size))
-        ]
+        column_heading_numbers = [str(x).zfill(self.num_chars_in_label) for x in self.column_coords]
         column_headings = self.VERTICAL_CHAR.join(column_heading_numbers) + self.VERTICAL_CHAR
         header = self.VERTICAL_CHAR + " " * self.num_chars_in_label + self.VERTICAL_CHAR + column_headings
         return header
@@ -114,35 +426,22 @@ class AsciiGrid:
         row_divider = (
                 self.LEFT_CHAR
                 + self.HORIZ_CHAR * self.num_chars_in_label
-                + cell_separator * self.grid_size
+                + cell_separator * self.number_of_columns
                 + self.RIGHT_CHAR
         )
         return row_divider
 
     def _data_row(self, row_number: int) -> str:
-        if row_number == 0 or self.horizontal_lines:
-            row = self._row_divider() + self.NEWLINE
-        else:
-            row = ""
-        row += self.VERTICAL_CHAR + str(row_number).zfill(self.num_chars_in_label) + self.VERTICAL_CHAR
-        for column_number in self.coord_list:
-            row += self._cell(column_number, row_number) * self.num_chars_in_label + self.VERTICAL_CHAR
-        return row + self.NEWLINE
-
-    def _cell(self, x_coord, y_coord) -> str:
-        # TODO: Somehow highlight different wells with different colors
-        marker = (
-            colorama.Fore.RED + "x" + colorama.Style.RESET_ALL
-            if (x_coord, y_coord) in self.cells
-            else " "
-        )
-        return marker
+        divider = self._row_divider() + self.NEWLINE if row_number == 0 or self.horizontal_lines else ""
+        heading = self.VERTICAL_CHAR + str(self.row_coords[row_number]).zfill(self.num_chars_in_label)
+        cells = "".join(self._cell_strings[self._colour_index[row_number]].tolist())
+        return divider + heading + self.VERTICAL_CHAR + cells + self.NEWLINE
 
     def _bottom_line(self) -> str:
         return(
             self.BOTTOM_LEFT_CHAR
             + (self.HORIZ_CHAR * self.num_chars_in_label + self.BOTTOM_CHAR)
-            * self.grid_size
+            * self.number_of_columns
             + self.HORIZ_CHAR * self.num_chars_in_label
             + self.BOTTOM_RIGHT_CHAR
         )
@@ -0,0 +1,61 @@
+""" Compare the original reservoir stylesheet with the indexed one on generated grids """
+
+import argparse
+import io
+import time
+
+import lxml.etree as ET
+import pandas as pd
+
+from src.model import HoshenKopelmanMethod
+from src.transform import load_transform
+from src.view import write_grid_xml
+
+STYLESHEETS = ("processing.xslt", "fastProcessing.xslt")
+
+parser = argparse.ArgumentParser(
+    description="Benchmark processing.xslt against fastProcessing.xslt"
+)
+parser.add_argument(
+    "--grid_sizes", type=int, nargs="+", help="Sizes of the grids to be generated", default=[10, 20, 50, 100, 500]
+)
+parser.add_argument(
+    "--probability", type=float, help="Location probability of the grids", default=0.9
+)
+parser.add_argument(
+    "--max_original_size",
+    type=int,
+    help="Largest grid to run the original stylesheet on, as it grows much faster than linearly",
+    default=20,
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    results = []
+    for grid_size in args.grid_sizes:
+        grid = HoshenKopelmanMethod(grid_size, args.probability, seed=0)
+        stream = io.BytesIO()
+        write_grid_xml(grid.grid, stream)
+        document = ET.fromstring(stream.getvalue()).getroottree()
+
+        row = {"Grid Size": grid_size, "Number of Sites": grid.number_of_cells}
+        for stylesheet in STYLESHEETS:
+            if stylesheet == "processing.xslt" and grid_size > args.max_original_size:
+                row[stylesheet] = row[f"{stylesheet} Wells"] = None
+                continue
+            transform = load_transform(stylesheet)
+            start = time.perf_counter()
+            result = transform(document)
+            row[stylesheet] = time.perf_counter() - start
+            row[f"{stylesheet} Wells"] = int(result.getroot().findtext("numberOfReservoirs"))
+
+        wells = {row[f"{stylesheet} Wells"] for stylesheet in STYLESHEETS} - {None}
+        if len(wells) > 1:
+            raise RuntimeError(f"The stylesheets disagree on the number of wells for grid size {grid_size}: {row}")
+        results.append(row)
+
+    # Keep the well counts as integers, even where the original stylesheet was skipped
+    df = pd.DataFrame(results).astype({f"{stylesheet} Wells": "Int64" for stylesheet in STYLESHEETS})
+    with pd.option_context("display.max_columns", None, "display.width", None, "display.float_format", "{:.3e}".format):
+        print(df)
@@ -1,3 +1,5 @@
+import numpy as np
+
 from src.model import GridModel, Cell
 
 
@@ -7,6 +9,8 @@ class DummyModel(GridModel):
 
 
 def create_grid_with_cells(cells: set[Cell]) -> DummyModel:
-    dummy = DummyModel(1, 1)
-    dummy._grid = cells
+    size = max(max(cell) for cell in cells) + 1
+    dummy = DummyModel(size, 1)
+    dummy._grid = np.zeros((size, size), dtype=bool)
+    dummy._grid[tuple(zip(*cells))] = True
     return dummy
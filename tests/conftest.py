@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# doe and orchestrator import their neighbours as top-level modules, as they do when run from inside src
+sys.path.append(str(Path(__file__).parent.parent / "src"))
@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.cache import DiskGridCache
+from common import DummyModel
+
+
+def test_cache_round_trip(tmp_path):
+    cache = DiskGridCache(tmp_path)
+    expected = DummyModel(20, 0.7, seed=3).grid
+    created = []
+
+    def create():
+        created.append(True)
+        return expected
+
+    first = cache.get_or_create(20, 0.7, 3, create)
+    second = cache.get_or_create(20, 0.7, 3, create)
+
+    assert created == [True]
+    assert isinstance(second, np.memmap)
+    assert (first == expected).all()
+    assert (second == expected).all()
+
+
+def test_cached_grid_is_copy_on_write(tmp_path):
+    cache = DiskGridCache(tmp_path)
+    cache.save(5, 0, 1, np.ones((5, 5), dtype=bool))
+
+    grid = DummyModel(5, 0, seed=1, grid=cache.load(5, 0, 1))
+    grid.remove_cell((0, 0))
+    assert grid.number_of_cells == 24
+    assert cache.load(5, 0, 1).all()
+
+
+def test_unseeded_grids_are_not_cached(tmp_path):
+    cache = DiskGridCache(tmp_path)
+    cache.get_or_create(5, 0.5, None, lambda: np.zeros((5, 5), dtype=bool))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,82 @@
+import os
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pyjion")
+
+from doe import DesignOfExperiments, SimulationRun
+from src.model import DequeMethod, HoshenKopelmanMethod, ScipyMethod, StackMethod, UnionFindMethod
+from src.transform import XsltMethod
+from src.view import GridView
+
+
+def test_peak_memory_covers_every_phase(monkeypatch):
+    view = GridView(UnionFindMethod(150, 0.6, seed=0))
+    sim_run = SimulationRun(view, profile_memory=True)
+    sim_run.execute()
+
+    # Measure again with the phases unable to reset the peak, so it covers the whole run
+    monkeypatch.setattr(tracemalloc, "reset_peak", lambda: None)
+    tracemalloc.start()
+    try:
+        start_memory, _ = tracemalloc.get_traced_memory()
+        view.get_reservoirs()
+        unnested_peak = tracemalloc.get_traced_memory()[1] - start_memory
+    finally:
+        tracemalloc.stop()
+
+    assert sim_run.peak_memory == pytest.approx(unnested_peak, rel=0.05)
+    assert sim_run.peak_memory > max(view.phase_peak_memory.values())
+
+
+def test_parallel_methods_share_unseeded_grids(monkeypatch):
+    # Pretend there are several CPUs, so that the methods run in different workers
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: [0] * 4, raising=False)
+    doe = DesignOfExperiments(
+        grid_sizes=[60],
+        location_probabilities=[0.8, 0.9],
+        model_types=[DequeMethod, HoshenKopelmanMethod, ScipyMethod, UnionFindMethod],
+        pyjion_state=[False],
+        workers=4,
+    )
+    results = doe.run()
+
+    for _, point in results.groupby("Probability"):
+        assert point["Number of Sites"].nunique() == 1
+        assert point["Number of Wells"].nunique() == 1
+
+
+def test_image_names(tmp_path):
+    doe = DesignOfExperiments(
+        grid_sizes=[20],
+        location_probabilities=[0.7],
+        model_types=[StackMethod],
+        pyjion_state=[True, False],
+        image_directory=str(tmp_path),
+    )
+    doe.run()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "StackMethod_20_0.7_no_pyjion.png",
+        "StackMethod_20_0.7_pyjion.png",
+    ]
+
+
+def test_points_above_max_size_are_recorded_empty():
+    doe = DesignOfExperiments(
+        grid_sizes=[10, XsltMethod.max_size + 1],
+        location_probabilities=[0.9],
+        model_types=[XsltMethod],
+        pyjion_state=[False],
+    )
+    results = doe.run()
+
+    assert results["Grid Size"].tolist() == [10, XsltMethod.max_size + 1]
+    assert results["Number of Wells"].notna().tolist() == [True, False]
+
+
+def test_phase_times_in_order():
+    sim_run = SimulationRun(GridView(UnionFindMethod(20, 0.7, seed=0)), repeats=3)
+    sim_run.execute()
+    assert list(sim_run.median_phase_times) == ["Generate", "Cluster", "Build", "Solve", "Convert"]
@@ -1,37 +1,189 @@
-import copy
-
-from methods import (
-    igraph_method,
-    recursive_method,
-    networkx_method,
-    stack_method,
-    stack_method_deque,
+import random
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from src.model import (
+    GridModel,
+    IGraphMethod,
+    RecursiveMethod,
+    NetworkXMethod,
+    StackMethod,
+    DequeMethod,
+    UnionFindMethod,
+    HoshenKopelmanMethod,
+    GraphToolMethod,
+    ScipyMethod,
+    IterativeDFSMethod,
+    IncrementalMethod,
 )
+from src.parallel import TileParallelMethod
+
+METHODS = [
+    IGraphMethod,
+    RecursiveMethod,
+    NetworkXMethod,
+    StackMethod,
+    DequeMethod,
+    UnionFindMethod,
+    HoshenKopelmanMethod,
+    ScipyMethod,
+    IterativeDFSMethod,
+    IncrementalMethod,
+]
+
+
+def _as_comparable(reservoirs: list[set]) -> list[list]:
+    return sorted(sorted(reservoir) for reservoir in reservoirs)
+
+
+@pytest.mark.parametrize("location_probability", [0.9, 0.8, 0.7])
+def test_method_equality(location_probability):
+    results = []
+    for method in METHODS:
+        grid: GridModel = method(30, location_probability, seed=0)
+        results.append(_as_comparable(grid.find_reservoirs()))
+
+    for result in results[1:]:
+        assert result == results[0]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_empty_grid(method):
+    assert len(method(10, 1).find_reservoirs()) == 0
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_full_grid(method):
+    reservoirs = method(10, 0).find_reservoirs()
+    assert len(reservoirs) == 1
+    assert len(reservoirs[0]) == 100
+
+
+def test_hoshen_kopelman_labels():
+    grid = HoshenKopelmanMethod(30, 0.7, seed=0)
+    labels = grid.label_grid()
+    reservoirs = grid.find_reservoirs()
+
+    assert ((labels != 0) == grid.grid).all()
+    assert labels.max() == len(reservoirs)
+    for reservoir in reservoirs:
+        assert len({labels[cell] for cell in reservoir}) == 1
+
+
+@pytest.mark.parametrize("location_probability", [0.9, 0.7, 0.5])
+def test_tile_parallel_matches_serial(monkeypatch, location_probability):
+    monkeypatch.setattr(TileParallelMethod, "workers", 2)
+    grid = TileParallelMethod(40, location_probability, seed=3)
+    expected = HoshenKopelmanMethod.label_array(grid.grid)
+
+    assert _as_comparable(grid.find_reservoirs()) == _as_comparable(grid._reservoirs_from_labels(expected))
+    assert grid.label_grid().max() == expected.max()
+
+
+def test_tile_parallel_keeps_its_workers(monkeypatch):
+    monkeypatch.setattr(TileParallelMethod, "workers", 2)
+    grid = TileParallelMethod(30, 0.7, seed=0)
+    first = grid.find_reservoirs()
+    executor = grid._executor
+    second = grid.find_reservoirs()
+
+    assert grid._executor is executor
+    assert "Build" in grid.phase_times
+    assert _as_comparable(first) == _as_comparable(second)
+
+    grid_memory = grid._grid_memory.name
+    grid.close()
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=grid_memory)
+    assert _as_comparable(grid.find_reservoirs()) == _as_comparable(first)
+    grid.close()
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_phase_times(method):
+    grid = method(10, 0.8, seed=0)
+    assert set(grid.phase_times) == {"Generate", "Cluster"}
+
+    grid.find_reservoirs()
+    assert "Solve" in grid.phase_times
+    assert all(phase_time >= 0 for phase_time in grid.phase_times.values())
+
+
+@pytest.mark.parametrize("location_probability", [1, 0.9, 0.7])
+def test_graph_tool_matches(location_probability):
+    pytest.importorskip("graph_tool")
+    grid = GraphToolMethod(30, location_probability, seed=0)
+    expected = HoshenKopelmanMethod.label_array(grid.grid)
+
+    assert _as_comparable(grid.find_reservoirs()) == _as_comparable(grid._reservoirs_from_labels(expected))
+
+
+@pytest.mark.parametrize("location_probability", [1, 0.9, 0.7])
+def test_scipy_csgraph_matches_ndimage(monkeypatch, location_probability):
+    grid = ScipyMethod(30, location_probability, seed=0)
+    expected = _as_comparable(grid.find_reservoirs())
+
+    monkeypatch.setattr(ScipyMethod, "use_csgraph", True)
+    assert _as_comparable(grid.find_reservoirs()) == expected
+    assert (grid.label_grid() > 0).sum() == grid.number_of_cells
+
+
+def test_reservoirs_result():
+    grid = HoshenKopelmanMethod(30, 0.7, seed=0)
+    reservoirs = grid.find_reservoirs()
+    expected = DequeMethod(30, 0.7, seed=0).find_reservoirs()
+
+    assert _as_comparable(reservoirs) == _as_comparable(expected)
+    assert sorted(reservoirs.sizes.tolist()) == sorted(len(reservoir) for reservoir in expected)
+    assert sum(reservoirs.size_histogram().values()) == len(expected)
+    assert reservoirs[-1] == reservoirs[len(reservoirs) - 1]
+    for index, reservoir in enumerate(reservoirs):
+        assert all(reservoirs.reservoir_of(cell) == index for cell in reservoir)
+    assert reservoirs.reservoir_of((-1, 0)) is None
+    labels = reservoirs.labels()
+    assert (labels > 0).sum() == grid.number_of_cells
+    assert all(labels[cell] == 1 for cell in reservoirs[0])
+    with pytest.raises(IndexError):
+        reservoirs[len(reservoirs)]
+
+
+def test_iterative_dfs_matches_recursive():
+    recursive = RecursiveMethod(30, 0.6, seed=0)
+    iterative = IterativeDFSMethod(30, 0.6, seed=0)
+    assert list(iterative.find_reservoirs()) == list(recursive.find_reservoirs())
+
+
+def test_iterative_dfs_deep_reservoir():
+    reservoirs = IterativeDFSMethod(150, 0).find_reservoirs()
+    assert len(reservoirs) == 1
+    assert len(reservoirs[0]) == 150 * 150
+
+
+def test_incremental_updates():
+    grid = IncrementalMethod(20, 0.6, seed=0)
+    rng = random.Random(0)
+    for _ in range(300):
+        cell = (rng.randrange(20), rng.randrange(20))
+        if rng.random() < 0.5:
+            grid.add_cell(cell)
+        else:
+            grid.remove_cell(cell)
+
+        expected = HoshenKopelmanMethod.label_array(grid.grid)
+        assert grid.number_of_reservoirs == expected.max()
+        assert _as_comparable(grid.find_reservoirs()) == _as_comparable(grid._reservoirs_from_labels(expected))
+
 
+def test_incremental_split_and_merge():
+    grid = IncrementalMethod(5, 1)
+    for y_coord in range(5):
+        grid.add_cell((2, y_coord))
+    assert grid.number_of_reservoirs == 1
 
-def test_method_equality():
-    grid = build_grid.Grid(100).to_set_of_tuples
-
-    igraph_results = igraph_method.find_reservoirs(copy.deepcopy(grid))
-    recursive_results = recursive_method.find_reservoirs(copy.deepcopy(grid))
-    networkx_results = networkx_method.find_reservoirs(copy.deepcopy(grid))
-    stack_results = stack_method.find_reservoirs(copy.deepcopy(grid))
-    deque_results = stack_method_deque.find_reservoirs(copy.deepcopy(grid))
-    # graphtool_results = graphtool_method.find_reservoirs(copy.deepcopy(grid))
-
-    for well in igraph_results:
-        assert well in igraph_results
-        assert well in recursive_results
-        assert well in networkx_results
-        assert well in stack_results
-        assert well in deque_results
-        # assert well in graphtool_results
-
-    assert (
-        len(igraph_results)
-        == len(recursive_results)
-        == len(networkx_results)
-        == len(stack_results)
-        == len(deque_results)
-        # == len(graphtool_results)
-    )
+    grid.remove_cell((2, 2))
+    assert grid.number_of_reservoirs == 2
+    grid.add_cell((1, 2))
+    assert grid.number_of_reservoirs == 1
+    with pytest.raises(IndexError):
+        grid.add_cell((5, 0))
@@ -1,6 +1,7 @@
 # content of test_sample.py
 import random
-from src.model import THRESHOLD
+import tracemalloc
+from src.model import THRESHOLD, generate_tile, generate_clustered_tile, push_active_neighbors
 from common import create_grid_with_cells, DummyModel
 
 
@@ -55,3 +56,94 @@ def test_diagonal_neighbors():
     neighbors = grid.get_neighbors((1, 1))
 
     assert set(neighbors) == grid.cells - {(1, 1)}
+
+
+def test_grid_is_boolean_array():
+    grid = DummyModel(10, seed=0)
+    assert grid.grid.shape == (10, 10)
+    assert grid.grid.dtype == bool
+    assert grid.number_of_cells == len(grid.cells)
+
+
+def test_cells_is_a_copy():
+    grid = DummyModel(3, 0)
+    cells = grid.cells
+    cells.clear()
+    assert len(grid.cells) == 9
+
+
+def test_vectorized_cluster_matches_iterative():
+    for seed in range(5):
+        grid = DummyModel(30, 0.6, seed=seed)
+        grid._grid = grid._generate(0.6)
+        assert (grid._cluster() == grid._cluster_iterative()).all()
+
+
+def test_phase_peak_memory_only_when_tracing():
+    assert DummyModel(10, seed=0).phase_peak_memory == {}
+
+    tracemalloc.start()
+    try:
+        grid = DummyModel(100, seed=0)
+    finally:
+        tracemalloc.stop()
+    assert grid.phase_peak_memory["Generate"] >= grid.grid.nbytes
+    assert "Cluster" in grid.phase_peak_memory
+
+
+def test_adjacency_matches_neighbors():
+    grid = DummyModel(20, 0.6, seed=0)
+    adjacency = grid.adjacency()
+    x_coords, y_coords = adjacency.coordinates()
+    cells = list(zip(x_coords.tolist(), y_coords.tolist()))
+    assert set(cells) == grid.cells
+
+    indptr, indices = adjacency.csr()
+    assert len(indices) == 2 * len(adjacency.edges)
+    for vertex, cell in enumerate(cells):
+        neighbors = {cells[neighbor] for neighbor in indices[indptr[vertex] : indptr[vertex + 1]]}
+        assert neighbors == set(grid.get_neighbors(cell))
+
+
+def test_fast_neighbors_match_get_neighbors():
+    grid = DummyModel(20, 0.6, seed=0)
+    stack = [-1]
+    for cell in grid.cells:
+        del stack[1:]
+        push_active_neighbors(*grid._flat_neighbor_table(), grid._padded_index(cell), stack)
+        assert stack[0] == -1
+        assert [grid._padded_index(neighbor) for neighbor in grid.get_neighbors(cell)] == stack[1:]
+
+
+def test_neighbor_table_follows_grid_replacement():
+    grid = DummyModel(3, 0)
+    assert len(grid.get_neighbors((1, 1))) == 8
+    grid._grid = grid._grid.copy()
+    grid._grid[0, 0] = False
+    assert len(grid.get_neighbors((1, 1))) == 7
+
+
+def test_tiles_match_whole_grid():
+    grid = DummyModel(23, 0.6, seed=5)
+    raw = grid._generate(0.6)
+    tiles = {(start, start + 5): generate_tile(23, 0.6, 5, start, start + 5) for start in (20, 5, 0, 15, 10)}
+    for (start, stop), tile in tiles.items():
+        assert (tile == raw[start:stop]).all()
+        assert (generate_clustered_tile(23, 0.6, 5, start, stop) == grid.grid[start:stop]).all()
+
+
+def test_generation_leaves_global_random_state():
+    state = random.getstate()
+    DummyModel(10, seed=1)
+    assert random.getstate() == state
+
+
+def test_shared_grid_is_copied_on_write():
+    shared = DummyModel(5, 0).grid
+    shared.flags.writeable = False
+    first = DummyModel(5, 0, grid=shared)
+    second = DummyModel(5, 0, grid=shared)
+
+    first.remove_cell((0, 0))
+    assert first.number_of_cells == 24
+    assert second.number_of_cells == 25
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from orchestrator import GridOrchestrator
+from src.model import HoshenKopelmanMethod, UnionFindMethod
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    monkeypatch.setattr(GridOrchestrator, "registry", OrderedDict())
+    monkeypatch.setattr(GridOrchestrator, "max_cache_bytes", None)
+    monkeypatch.setattr(GridOrchestrator, "disk_cache", None)
+
+
+def test_model_types_share_cells():
+    first = GridOrchestrator._get_grid(20, 0.7, HoshenKopelmanMethod)
+    second = GridOrchestrator._get_grid(20, 0.7, UnionFindMethod)
+
+    assert isinstance(first, HoshenKopelmanMethod)
+    assert isinstance(second, UnionFindMethod)
+    assert first.grid is second.grid
+    assert not first.grid.flags.writeable
+    assert len(GridOrchestrator.registry) == 1
+
+
+def test_seed_is_part_of_key():
+    first = GridOrchestrator._get_grid(20, 0.7, HoshenKopelmanMethod, seed=1)
+    second = GridOrchestrator._get_grid(20, 0.7, HoshenKopelmanMethod, seed=2)
+    again = GridOrchestrator._get_grid(20, 0.7, UnionFindMethod, seed=1)
+
+    assert set(GridOrchestrator.registry) == {(20, 0.7, 1), (20, 0.7, 2)}
+    assert not np.array_equal(first.grid, second.grid)
+    assert again.grid is first.grid
+
+
+def test_least_recently_used_grids_are_evicted(monkeypatch):
+    # Room for two 20x20 grids of one byte per element
+    monkeypatch.setattr(GridOrchestrator, "max_cache_bytes", 2 * 20 * 20)
+    for seed in (1, 2, 1, 3):
+        GridOrchestrator._get_grid(20, 0.7, HoshenKopelmanMethod, seed=seed)
+    assert list(GridOrchestrator.registry) == [(20, 0.7, 1), (20, 0.7, 3)]
+
+    # A grid bigger than the whole budget is built but not kept, and evicts nothing
+    big = GridOrchestrator._get_grid(50, 0.7, HoshenKopelmanMethod, seed=1)
+    assert big.grid.shape == (50, 50)
+    assert list(GridOrchestrator.registry) == [(20, 0.7, 1), (20, 0.7, 3)]
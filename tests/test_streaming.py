@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import src.model
+from src.model import HoshenKopelmanMethod
+from src.streaming import StreamingReservoirFinder
+
+
+@pytest.fixture(params=[1 << 22, 100])
+def block_size(request, monkeypatch):
+    # A small block size forces the grid to be generated over many strips
+    monkeypatch.setattr(src.model, "GENERATION_BLOCK_SIZE", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("location_probability", [0.9, 0.7, 0.5])
+def test_streaming_matches_in_memory(block_size, location_probability):
+    grid = HoshenKopelmanMethod(40, location_probability, seed=1)
+    expected = sorted(sorted(reservoir) for reservoir in grid.find_reservoirs())
+
+    finder = StreamingReservoirFinder.from_parameters(40, location_probability, seed=1)
+    assert sorted(sorted(reservoir) for reservoir in finder.reservoirs()) == expected
+
+
+def test_streaming_sizes_from_strips():
+    grid = HoshenKopelmanMethod(40, 0.7, seed=2)
+    strips = np.array_split(grid.grid, 7)
+    sizes = list(StreamingReservoirFinder(strips).reservoir_sizes())
+
+    assert sorted(sizes) == sorted(len(reservoir) for reservoir in grid.find_reservoirs())
+
+
+def test_streaming_empty_grid():
+    assert StreamingReservoirFinder.from_parameters(10, 1).count_reservoirs() == 0
+    assert StreamingReservoirFinder([]).count_reservoirs() == 0
@@ -0,0 +1,50 @@
+import io
+from pathlib import Path
+
+import lxml.etree as ET
+
+from src.model import HoshenKopelmanMethod
+from src.transform import load_transform, XsltMethod, FastXsltMethod
+from src.view import write_grid_xml
+
+INPUT_XML = Path(__file__).parent.parent / "xslt" / "input.xml"
+
+
+def _summarize(results: ET._ElementTree) -> tuple:
+    root = results.getroot()
+    reservoirs = [
+        (int(reservoir.get("size")), sorted((location.findtext("x"), location.findtext("y")) for location in reservoir))
+        for reservoir in root.find("reservoirs")
+    ]
+    return int(root.findtext("numberOfReservoirs")), reservoirs
+
+
+def test_fast_stylesheet_matches_original():
+    document = ET.parse(str(INPUT_XML))
+    original = _summarize(load_transform("processing.xslt")(document))
+    fast = _summarize(load_transform("fastProcessing.xslt")(document))
+    assert fast == original
+
+
+def test_fast_stylesheet_matches_model():
+    grid = HoshenKopelmanMethod(40, 0.7, seed=0)
+    stream = io.BytesIO()
+    write_grid_xml(grid.grid, stream)
+    stream.seek(0)
+
+    number_of_reservoirs, reservoirs = _summarize(load_transform("fastProcessing.xslt")(ET.parse(stream)))
+    assert number_of_reservoirs == len(grid.find_reservoirs())
+    assert sorted(size for size, _ in reservoirs) == sorted(grid.find_reservoirs().sizes.tolist())
+
+
+def _as_comparable(reservoirs) -> list[list]:
+    return sorted(sorted(reservoir) for reservoir in reservoirs)
+
+
+def test_xslt_methods_match_model():
+    for method, grid_size in ((XsltMethod, 12), (FastXsltMethod, 40)):
+        grid = method(grid_size, 0.8, seed=0)
+        expected = HoshenKopelmanMethod(grid_size, 0.8, seed=0).find_reservoirs()
+
+        assert _as_comparable(grid.find_reservoirs()) == _as_comparable(expected)
+        assert {"Build", "Solve", "Convert"} <= set(grid.phase_times)
@@ -0,0 +1,151 @@
+import io
+import struct
+import zlib
+from pathlib import Path
+
+import colorama
+import lxml.etree as ET
+import numpy as np
+
+import src.view
+from src.model import HoshenKopelmanMethod
+from src.view import AsciiGrid, GridView, downsample, label_colours, read_grid_xml, write_grid_xml
+from common import DummyModel, create_grid_with_cells
+
+
+def test_streamed_xml_matches_to_xml(monkeypatch):
+    # A small chunk size makes the writer flush several times
+    monkeypatch.setattr(src.view, "XML_CHUNK_SIZE", 7)
+    view = GridView(DummyModel(20, 0.6, seed=0))
+    stream = io.BytesIO()
+    view.write_xml(stream)
+
+    assert ET.tostring(ET.fromstring(stream.getvalue())) == ET.tostring(view.to_xml)
+
+
+def test_xml_round_trip(tmp_path):
+    grid = DummyModel(20, 0.6, seed=1).grid
+    path = tmp_path / "grid.xml"
+    write_grid_xml(grid, path)
+
+    assert (read_grid_xml(path, size=20) == grid).all()
+    inferred = read_grid_xml(path)
+    assert (inferred == grid[: len(inferred), : len(inferred)]).all()
+
+
+INPUT_XML = Path(__file__).parent.parent / "xslt" / "input.xml"
+
+
+def test_read_original_input():
+    grid = read_grid_xml(INPUT_XML)
+    assert grid.sum() == len(ET.parse(INPUT_XML).getroot())
+
+
+def test_ascii_art_colours_each_reservoir():
+    view = GridView(create_grid_with_cells({(0, 0), (0, 1), (3, 3)}))
+    stream = io.StringIO()
+    view.to_ascii_art(stream)
+    rows = stream.getvalue().splitlines()
+
+    # Rows run along y and columns along x
+    assert rows[3].count(colorama.Fore.RED) == 1
+    assert rows[4].count(colorama.Fore.RED) == 1
+    assert rows[6].count(colorama.Fore.GREEN) == 1
+    assert colorama.Fore.GREEN not in "".join(rows[:6])
+
+
+def test_ascii_art_downsamples_big_grids():
+    model = DummyModel(250, 0.6, seed=0)
+    table = AsciiGrid(model.grid, 250)
+    rows = table.draw().splitlines()
+
+    assert table.step == 3
+    assert table.number_of_columns == 84
+    assert len(rows) == 84 + 4
+    assert rows[1].split(AsciiGrid.VERTICAL_CHAR)[2:4] == ["000", "003"]
+
+
+def test_ascii_art_window():
+    model = DummyModel(50, 0.6, seed=0)
+    table = AsciiGrid(model.grid, 50, origin=(10, 20), window=5)
+    rows = table.draw().splitlines()
+
+    assert rows[1].split(AsciiGrid.VERTICAL_CHAR)[2:-1] == ["10", "11", "12", "13", "14"]
+    assert rows[3].startswith(AsciiGrid.VERTICAL_CHAR + "20")
+    for y_offset, row in enumerate(rows[3:-1]):
+        cells = row.split(AsciiGrid.VERTICAL_CHAR)[2:-1]
+        assert [cell != "  " for cell in cells] == model.grid[10:15, 20 + y_offset].tolist()
+
+
+def _read_png(path: Path) -> np.ndarray:
+    data = path.read_bytes()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    position, chunks = 8, {}
+    while position < len(data):
+        (length,) = struct.unpack(">I", data[position : position + 4])
+        chunk_type = data[position + 4 : position + 8]
+        chunks[chunk_type] = chunks.get(chunk_type, b"") + data[position + 8 : position + 8 + length]
+        position += 12 + length
+    width, height, _, colour_type = struct.unpack(">IIBB", chunks[b"IHDR"][:10])
+    channels = 3 if colour_type == 2 else 1
+    rows = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, -1)
+    assert not rows[:, 0].any()
+    return rows[:, 1:].reshape(height, width, channels).squeeze()
+
+
+def test_write_image(tmp_path, monkeypatch):
+    # A small chunk size spreads the image over several IDAT chunks
+    monkeypatch.setattr(src.view, "IMAGE_CHUNK_ROWS", 7)
+    view = GridView(DummyModel(30, 0.6, seed=0))
+    grid = view._grid.grid
+
+    view.write_image(tmp_path / "mask.png")
+    assert (_read_png(tmp_path / "mask.png") == np.where(grid.T, 255, 0)).all()
+
+    view.write_image(tmp_path / "reservoirs.png", reservoirs=True)
+    assert (_read_png(tmp_path / "reservoirs.png") == label_colours(view.reservoir_labels().T)).all()
+
+    # Labels from a result already found are used as they are, without labelling the grid again
+    monkeypatch.setattr(view, "reservoir_labels", None)
+    labels = HoshenKopelmanMethod(30, 0.6, seed=0).find_reservoirs().labels()
+    view.write_image(tmp_path / "reservoirs.ppm", reservoirs=True, labels=labels)
+    header, pixels = (tmp_path / "reservoirs.ppm").read_bytes().split(b"\n255\n", 1)
+    assert header == b"P6\n30 30"
+    assert np.frombuffer(pixels, dtype=np.uint8).tobytes() == label_colours(labels.T).tobytes()
+
+    view.write_image(tmp_path / "mask.pgm")
+    header, pixels = (tmp_path / "mask.pgm").read_bytes().split(b"\n255\n", 1)
+    assert header == b"P5\n30 30"
+    assert (np.frombuffer(pixels, dtype=np.uint8).reshape(30, 30) == np.where(grid.T, 255, 0)).all()
+
+
+def test_write_image_tiles(tmp_path):
+    view = GridView(DummyModel(30, 0.6, seed=0))
+    paths = view.write_image(tmp_path / "grid.png", step=2, tile_size=20)
+
+    assert [path.name for path in paths] == ["grid_0_0.png", "grid_0_20.png", "grid_20_0.png", "grid_20_20.png"]
+    expected = downsample(view._grid.grid[20:, :20], 2)
+    assert (_read_png(paths[2]) == np.where(expected.T, 255, 0)).all()
+    assert _read_png(paths[3]).shape == (5, 5)
+
+
+def test_downsample():
+    values = np.arange(25).reshape(5, 5)
+    assert downsample(values, 2).tolist() == [[6, 8, 9], [16, 18, 19], [21, 23, 24]]
+
+
+def test_ascii_art_only_labels_what_is_drawn(monkeypatch):
+    labelled_shapes = []
+    label_array = HoshenKopelmanMethod.label_array
+
+    def record_shape(grid):
+        labelled_shapes.append(grid.shape)
+        return label_array(grid)
+
+    monkeypatch.setattr(HoshenKopelmanMethod, "label_array", record_shape)
+    view = GridView(DummyModel(500, 0.6, seed=0))
+    view.to_ascii_art(io.StringIO())
+    view.to_ascii_art(io.StringIO(), origin=(200, 300), window=10)
+
+    # The whole grid at one character per 5x5 block, then the window with a border of one element
+    assert labelled_shapes == [(100, 100), (12, 12)]